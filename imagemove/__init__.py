@@ -0,0 +1,43 @@
+"""imagemove：批量图片格式转换"""
+
+from .core import (
+    CONFLICT_POLICIES,
+    DEFAULT_COMPRESSION,
+    DEFAULT_WORKERS,
+    OUTPUT_FORMATS,
+    SUPPORTED_EXTENSIONS,
+    WECHAT_FORMAT,
+    BatchReport,
+    ConversionJob,
+    ConversionResult,
+    OutputVariant,
+    convert_image,
+    get_output_path,
+    plan_jobs,
+    plan_variant_jobs,
+    resolve_conflict,
+    save_image,
+    save_image_for_wechat,
+)
+from .engine import BatchEngine
+
+__all__ = [
+    "CONFLICT_POLICIES",
+    "DEFAULT_COMPRESSION",
+    "DEFAULT_WORKERS",
+    "OUTPUT_FORMATS",
+    "SUPPORTED_EXTENSIONS",
+    "WECHAT_FORMAT",
+    "BatchEngine",
+    "BatchReport",
+    "ConversionJob",
+    "ConversionResult",
+    "OutputVariant",
+    "convert_image",
+    "get_output_path",
+    "plan_jobs",
+    "plan_variant_jobs",
+    "resolve_conflict",
+    "save_image",
+    "save_image_for_wechat",
+]
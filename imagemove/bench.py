@@ -0,0 +1,405 @@
+"""性能基准：python -m imagemove.bench run / resize
+
+run 会生成确定性的合成图片集（多种格式、分辨率和 EXIF 方向），
+分别测量解码、缩略图、各输出格式转换的速度、峰值内存和输出大小，
+并可与保存的基线 JSON 对比找出性能回退。
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageChops, ImageOps
+import PIL
+
+from .core import (
+    WECHAT_FORMAT,
+    WECHAT_SHORT_SIDE,
+    encode_options,
+    save_image,
+    save_image_for_wechat,
+)
+from .encoders import ENCODER_PROFILES
+from .plugins import open_image, register_all
+from .profiling import peak_rss
+from .thumbcache import user_cache_dir
+from .thumbnails import make_thumbnail
+
+CORPUS_FORMATS = {
+    "jpg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "heic": "HEIF",
+    "avif": "AVIF",
+}
+CORPUS_SIZES = [(1024, 768), (4000, 3000)]
+CORPUS_ORIENTATIONS = [1, 6, 3, 8]
+CONVERT_FORMATS = ["jpg", "webp", "heic", "avif", WECHAT_FORMAT]
+REGRESSION_THRESHOLD = 0.10
+
+
+def synthetic_image(width, height, seed=0):
+    """生成确定性的合成照片：平滑的随机色块 + 分形细节"""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (16, 12))
+    small.putdata(
+        [
+            (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            for _ in range(16 * 12)
+        ]
+    )
+    base = small.resize((width, height), Image.BICUBIC)
+    detail = Image.effect_mandelbrot(
+        (width, height), (-2.0, -1.2, 0.8, 1.2), 64
+    ).convert("RGB")
+    return Image.blend(base, detail, 0.35)
+
+
+def generate_corpus(directory, sizes=CORPUS_SIZES, formats=CORPUS_FORMATS):
+    """在 directory 中生成合成图片集，已存在的文件直接复用，返回文件列表"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, (width, height) in enumerate(sizes):
+        img = None
+        for ext_index, (ext, pil_format) in enumerate(formats.items()):
+            orientation = CORPUS_ORIENTATIONS[
+                (index + ext_index) % len(CORPUS_ORIENTATIONS)
+            ]
+            path = os.path.join(directory, f"{width}x{height}_o{orientation}.{ext}")
+            if not os.path.exists(path):
+                if img is None:
+                    img = synthetic_image(width, height, seed=index)
+                exif = Image.Exif()
+                exif[0x0112] = orientation
+                try:
+                    img.save(path, pil_format, quality=90, exif=exif.tobytes())
+                except (KeyError, OSError, ValueError) as e:
+                    print(f"跳过 {ext}（当前环境无法写入: {e}）", file=sys.stderr)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+            paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回 None"""
+    return peak_rss() / (1024 * 1024) or None
+
+
+def decode(path, output_dir):
+    with open_image(path) as img:
+        img.load()
+    return 0
+
+
+def thumbnail(path, output_dir):
+    make_thumbnail(path)
+    return 0
+
+
+def convert(output_format):
+    def run(path, output_dir):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if output_format == WECHAT_FORMAT:
+            output_path = os.path.join(output_dir, f"{name}_wechat.jpg")
+            save_image_for_wechat(path, output_path, 85)
+        else:
+            output_path = os.path.join(output_dir, f"{name}.{output_format}")
+            save_image(path, output_path, output_format, 85)
+        return os.path.getsize(output_path)
+
+    return run
+
+
+def case_functions():
+    """基准用例：名称 -> func(源文件, 输出目录) 返回输出字节数"""
+    cases = {"decode": decode, "thumbnail": thumbnail}
+    for output_format in CONVERT_FORMATS:
+        name = "wechat" if output_format == WECHAT_FORMAT else output_format
+        cases[f"convert:{name}"] = convert(output_format)
+    return cases
+
+
+def run_case(name, paths, repeat):
+    """在独立进程中运行一个用例，使峰值内存互不影响"""
+    func = case_functions()[name]
+    best = float("inf")
+    output_bytes = 0
+    with tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output_bytes = sum(func(path, output_dir) for path in paths)
+            best = min(best, time.perf_counter() - start)
+    return {
+        "images": len(paths),
+        "seconds": round(best, 4),
+        "images_per_second": round(len(paths) / best, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "output_bytes": output_bytes,
+    }
+
+
+def pillow_heif_version():
+    try:
+        import pillow_heif
+    except ImportError:
+        return None
+    return pillow_heif.__version__
+
+
+def run_benchmarks(paths, repeat=3, cases=None):
+    """运行全部（或指定的）用例，返回结果字典"""
+    results = {}
+    for name in cases or case_functions():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                results[name] = executor.submit(run_case, name, paths, repeat).result()
+            except Exception as e:
+                print(f"用例 {name} 失败: {e}", file=sys.stderr)
+                continue
+        print(format_row(name, results[name]), file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "pillow_heif": pillow_heif_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": sorted(os.path.basename(path) for path in paths),
+            "repeat": repeat,
+        },
+        "cases": results,
+    }
+
+
+def format_row(name, result):
+    rss = result["peak_rss_mb"]
+    return (
+        f"{name:<16} {result['images_per_second']:>8.2f} 张/秒  "
+        f"{(f'{rss:.0f} MB' if rss is not None else '-'):>8}  "
+        f"{result['output_bytes'] / 1024:>10.0f} KB"
+    )
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """与基线对比，返回回退项列表（速度下降、内存或输出大小增加超过阈值）"""
+    regressions = []
+    for name, result in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        checks = [
+            (
+                "images_per_second",
+                base["images_per_second"],
+                result["images_per_second"],
+                -1,
+            ),
+            ("peak_rss_mb", base.get("peak_rss_mb"), result.get("peak_rss_mb"), 1),
+            ("output_bytes", base["output_bytes"], result["output_bytes"], 1),
+        ]
+        for metric, old, new, direction in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            print(
+                f"{name:<16} {metric:<18} {old:>12.2f} -> {new:>12.2f} ({change:+.1%})"
+            )
+            if change * direction > threshold:
+                regressions.append(f"{name} {metric} {change:+.1%}")
+    return regressions
+
+
+def compare_profiles(paths, formats=("jpg", "webp", "heic", "avif"), quality=85):
+    """用已解码的图片测量各编码配置在每种格式上的编码速度和输出大小"""
+    images = []
+    for path in paths:
+        with open_image(path) as img:
+            images.append(ImageOps.exif_transpose(img).convert("RGB"))
+    pil_formats = {ext: Image.registered_extensions().get(f".{ext}") for ext in formats}
+    results = {}
+    for ext, pil_format in pil_formats.items():
+        if pil_format not in Image.SAVE:
+            continue
+        for profile in ENCODER_PROFILES:
+            start = time.perf_counter()
+            output_bytes = 0
+            for img in images:
+                buffer = io.BytesIO()
+                # 每次重新生成参数：pillow_heif 会修改传入的 enc_params
+                img.save(
+                    buffer, **encode_options(pil_format, ext, quality, None, profile)
+                )
+                output_bytes += buffer.tell()
+            seconds = time.perf_counter() - start
+            results[f"{ext}:{profile}"] = {
+                "images_per_second": round(len(images) / seconds, 3),
+                "output_bytes": output_bytes,
+            }
+            print(
+                f"{ext:<5} {profile:<16} {len(images) / seconds:>8.2f} 张/秒  "
+                f"{output_bytes / 1024:>10.0f} KB",
+                file=sys.stderr,
+            )
+    return results
+
+
+def psnr(img_a, img_b):
+    """计算两张图片的 PSNR（dB）"""
+    diff = ImageChops.difference(img_a.convert("RGB"), img_b.convert("RGB"))
+    histogram = diff.histogram()
+    squares = sum(count * (index % 256) ** 2 for index, count in enumerate(histogram))
+    mse = squares / (img_a.width * img_a.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def legacy_wechat(image_path, output, compression_quality):
+    """旧实现：整幅 exif_transpose 后一次性 LANCZOS 缩放
+
+    编码参数与新路径相同（encode_options），对比的只是解码和缩放。
+    """
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        if width > height:
+            size = (int(width * WECHAT_SHORT_SIDE / height), WECHAT_SHORT_SIDE)
+        else:
+            size = (WECHAT_SHORT_SIDE, int(height * WECHAT_SHORT_SIDE / width))
+        img = img.resize(size, Image.LANCZOS)
+        img.save(
+            output,
+            **encode_options(
+                "JPEG", WECHAT_FORMAT, compression_quality, img.info.get("exif")
+            ),
+        )
+
+
+def timed(func, *args, repeat=3):
+    """返回多次运行中最短的 CPU 时间"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        func(*args)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def compare_wechat_resize(width=8160, height=6120, quality=90, repeat=3):
+    """对比朋友圈适用输出的新旧缩放路径"""
+    source = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    synthetic_image(width, height).save(source, "JPEG", quality=95, exif=exif)
+
+    legacy_out, fast_out = io.BytesIO(), io.BytesIO()
+
+    def run_legacy():
+        source.seek(0)
+        legacy_out.seek(0)
+        legacy_out.truncate()
+        legacy_wechat(source, legacy_out, quality)
+
+    def run_fast():
+        source.seek(0)
+        fast_out.seek(0)
+        fast_out.truncate()
+        save_image_for_wechat(source, fast_out, quality)
+
+    legacy_time = timed(run_legacy, repeat=repeat)
+    fast_time = timed(run_fast, repeat=repeat)
+    with Image.open(legacy_out) as a, Image.open(fast_out) as b:
+        return {
+            "source": f"{width}x{height} JPEG",
+            "output": f"{b.width}x{b.height}",
+            "legacy_cpu_s": round(legacy_time, 3),
+            "fast_cpu_s": round(fast_time, 3),
+            "speedup": round(legacy_time / fast_time, 1),
+            "psnr_db": round(psnr(a, b), 1),
+        }
+
+
+def parse_sizes(text):
+    """解析分辨率列表，例如 1024x768,4000x3000"""
+    return [tuple(int(v) for v in item.split("x")) for item in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="imagemove.bench")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="运行基准测试")
+    run_parser.add_argument(
+        "--corpus",
+        default=os.path.join(user_cache_dir(), "bench-corpus"),
+        help="合成图片集目录（不存在时自动生成）",
+    )
+    run_parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=CORPUS_SIZES,
+        help="分辨率列表，例如 1024x768,4000x3000",
+    )
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument(
+        "--case", action="append", help="只运行指定用例（可重复），如 convert:jpg"
+    )
+    run_parser.add_argument("--save", help="把结果保存为 JSON（可作为基线）")
+    run_parser.add_argument("--baseline", help="与基线 JSON 对比")
+    run_parser.add_argument(
+        "--threshold", type=float, default=REGRESSION_THRESHOLD, help="回退阈值"
+    )
+
+    profiles_parser = commands.add_parser("profiles", help="对比各编码配置的速度和大小")
+    profiles_parser.add_argument(
+        "--corpus", default=os.path.join(user_cache_dir(), "bench-corpus")
+    )
+    profiles_parser.add_argument("--sizes", type=parse_sizes, default=CORPUS_SIZES)
+    profiles_parser.add_argument("-q", "--quality", type=int, default=85)
+    profiles_parser.add_argument("--save", help="把结果保存为 JSON")
+
+    resize_parser = commands.add_parser("resize", help="对比朋友圈适用缩放的新旧实现")
+    resize_parser.add_argument("--width", type=int, default=8160)
+    resize_parser.add_argument("--height", type=int, default=6120)
+    resize_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args(argv)
+    register_all()
+    if args.command == "resize":
+        result = compare_wechat_resize(args.width, args.height, repeat=args.repeat)
+        for key, value in result.items():
+            print(f"{key:>14}: {value}")
+        return 0
+    if args.command == "profiles":
+        paths = generate_corpus(args.corpus, args.sizes)
+        results = compare_profiles(paths, quality=args.quality)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        return 0
+
+    paths = generate_corpus(args.corpus, args.sizes)
+    results = run_benchmarks(paths, args.repeat, args.case)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("性能回退:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
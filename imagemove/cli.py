@@ -0,0 +1,360 @@
+"""命令行入口：python -m imagemove 或 main.py --headless"""
+
+import argparse
+import dataclasses
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from .core import (
+    CONFLICT_POLICIES,
+    DEFAULT_COMPRESSION,
+    DEFAULT_WORKERS,
+    OUTPUT_FORMATS,
+    SUPPORTED_EXTENSIONS,
+    WECHAT_FORMAT,
+    BatchReport,
+    OutputVariant,
+    plan_variant_jobs,
+)
+from .encoders import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES
+from .engine import BatchEngine
+from .manifest import BatchManifest
+from .metadata import MetadataIndex
+from .profiling import BatchProfile
+from .scan import scan_images
+from .watch import DEFAULT_SETTLE, HotFolder
+
+FORMAT_ALIASES = {"wechat": WECHAT_FORMAT}
+SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "K": 1024,
+    "KB": 1024,
+    "M": 1024**2,
+    "MB": 1024**2,
+    "G": 1024**3,
+    "GB": 1024**3,
+}
+
+
+def parse_size(text):
+    """解析文件大小，例如 500K、2M、4G、123456"""
+    value = text.strip().upper()
+    number = value.rstrip("KMGB")
+    unit = value[len(number) :]
+    if unit not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"无法识别的大小: {text}")
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的大小: {text}")
+
+
+def parse_variant(text):
+    """解析输出变体：格式[:质量[:最长边[:文件名后缀]]]，例如 webp:80、jpg:90:2048:_web
+
+    省略的质量为 None，由 -q 决定；最长边为 0 或省略时不缩放。
+    """
+    parts = text.split(":", 3)
+    output_format = FORMAT_ALIASES.get(parts[0], parts[0])
+    if output_format not in OUTPUT_FORMATS:
+        raise argparse.ArgumentTypeError(f"未知的输出格式: {parts[0]}")
+    try:
+        quality = int(parts[1]) if len(parts) > 1 and parts[1] else None
+        max_dimension = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的输出变体: {text}")
+    if quality is not None and not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError(f"压缩质量必须在 1-100 之间: {text}")
+    if max_dimension < 0:
+        raise argparse.ArgumentTypeError(f"最长边不能为负数: {text}")
+    suffix = parts[3] if len(parts) > 3 else ""
+    return OutputVariant(output_format, quality, max_dimension, suffix)
+
+
+def output_variants(args, output_format):
+    """命令行指定的输出变体，没有 --variant 时为 -f/-q 对应的一种输出"""
+    if not args.variant:
+        return [OutputVariant(output_format, args.quality)]
+    return [
+        dataclasses.replace(variant, quality=variant.quality or args.quality)
+        for variant in args.variant
+    ]
+
+
+def print_problem(result):
+    """把出错和带警告（如超出大小上限）的结果打印到 stderr"""
+    if result.status == "error":
+        print(f"处理图片 {result.image_path} 时出错: {result.error}", file=sys.stderr)
+    elif result.warning:
+        print(f"警告: {result.image_path}: {result.warning}", file=sys.stderr)
+
+
+def collect_inputs(patterns, recursive=False):
+    """展开输入的文件、目录和通配符，返回去重后的图片路径列表"""
+    paths = []
+    seen = set()
+
+    def add(path):
+        if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+            return
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for path, _ in sorted(scan_images(pattern)):
+                    add(path)
+            else:
+                for file_name in sorted(os.listdir(pattern)):
+                    file_path = os.path.join(pattern, file_name)
+                    if os.path.isfile(file_path):
+                        add(file_path)
+        elif glob.has_magic(pattern):
+            for match in sorted(glob.glob(pattern, recursive=recursive)):
+                if os.path.isfile(match):
+                    add(match)
+        elif os.path.isfile(pattern):
+            add(pattern)
+        else:
+            print(f"找不到输入: {pattern}", file=sys.stderr)
+    return paths
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="imagemove", description="批量转换图片格式（无界面模式）"
+    )
+    parser.add_argument("inputs", nargs="+", help="输入文件、目录或通配符")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="original",
+        choices=OUTPUT_FORMATS + list(FORMAT_ALIASES),
+        help="输出格式（wechat 等同于 朋友圈适用）",
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        type=int,
+        default=DEFAULT_COMPRESSION,
+        help="压缩质量 1-100（100 为不压缩）",
+    )
+    parser.add_argument(
+        "--variant",
+        action="append",
+        type=parse_variant,
+        metavar="FORMAT[:QUALITY[:MAX[:SUFFIX]]]",
+        help="同时生成多种输出，可重复（如 --variant jpg:95 --variant webp:80 "
+        "--variant wechat:85:1080），每张图片只解码一次；指定后忽略 -f",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        default=0,
+        help="每个输出文件的大小上限（如 500K、2M），设置后自动搜索压缩质量",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_size,
+        default=0,
+        help="同时处理的图片估算内存之和的上限（如 4G），默认为物理内存的一半",
+    )
+    parser.add_argument(
+        "--encoder-profile",
+        default=DEFAULT_ENCODER_PROFILE,
+        choices=ENCODER_PROFILES,
+        help="编码配置：fast 最快，max-compression 文件最小",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        default="skip",
+        choices=CONFLICT_POLICIES,
+        help="输出文件已存在时的处理方式",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=DEFAULT_WORKERS, help="并行进程数"
+    )
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归处理子目录")
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="不对内容相同的输入去重（默认只编码一次，其余用硬链接或复制）",
+    )
+    parser.add_argument(
+        "--no-passthrough",
+        action="store_true",
+        help="总是重新编码（默认已是输出格式且满足要求的图片直接复制；"
+        "带 EXIF 的源文件只在输出格式本来就保留 EXIF 时复制）",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="不使用输出目录中的清单（默认跳过上次已处理且未变化的图片）",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="持续监视输入目录，新图片写完后自动转换（Ctrl+C 结束）",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE,
+        help="监视模式下文件大小和修改时间保持不变多少秒后才处理",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="监视模式下定时列目录，不使用 inotify（如网络文件系统）",
+    )
+    parser.add_argument(
+        "--watch-for",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="监视指定秒数后结束（默认一直运行）",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="记录各阶段耗时并导出到 PATH（.csv 为汇总表，其他为 JSON）",
+    )
+    return parser
+
+
+def main(argv=None):
+    """执行无界面批处理，向 stdout 输出 JSON 汇总，返回退出码"""
+    args = build_parser().parse_args(argv)
+    if not 1 <= args.quality <= 100:
+        print("压缩质量必须在 1-100 之间", file=sys.stderr)
+        return 2
+
+    output_format = FORMAT_ALIASES.get(args.format, args.format)
+    os.makedirs(args.output, exist_ok=True)
+    if args.watch:
+        return watch(args, output_format)
+
+    start = time.perf_counter()
+    image_paths = collect_inputs(args.inputs, args.recursive)
+    variants = output_variants(args, output_format)
+    manifest = None if args.no_manifest else BatchManifest(args.output)
+    jobs, skipped = plan_variant_jobs(
+        image_paths,
+        args.output,
+        variants,
+        args.on_conflict,
+        args.max_size,
+        manifest,
+        profile=bool(args.profile),
+        encoder_profile=args.encoder_profile,
+    )
+    jobs_by_output = {job.output_path: job for job in jobs}
+
+    report = BatchReport(total=len(image_paths) * len(variants))
+    profile = BatchProfile()
+    for result in skipped:
+        report.add(result)
+    try:
+        engine = BatchEngine(
+            args.workers,
+            dedup=not args.no_dedup,
+            metadata=MetadataIndex(),
+            memory_budget=args.memory_budget,
+            passthrough=not args.no_passthrough,
+        )
+        for result in engine.run(jobs):
+            report.add(result)
+            profile.add(result)
+            print_problem(result)
+            if result.status != "error" and manifest is not None:
+                manifest.record(jobs_by_output[result.output_path], result)
+        report.pipeline = engine.pipeline.to_dict()
+    finally:
+        if manifest is not None:
+            manifest.close()
+    report.elapsed = time.perf_counter() - start
+    if args.profile:
+        profile.save(args.profile)
+
+    json.dump(report.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report.failed else 0
+
+
+def watch(args, output_format):
+    """监视模式：处理到 Ctrl+C（或 --watch-for 秒）为止，再输出 JSON 汇总"""
+    if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+        print("监视模式需要一个输入目录", file=sys.stderr)
+        return 2
+
+    report = BatchReport()
+    profile = BatchProfile()
+
+    def on_result(result, latency):
+        report.total += 1
+        report.add(result)
+        profile.add(result)
+        print_problem(result)
+
+    manifest = None if args.no_manifest else BatchManifest(args.output)
+    engine = BatchEngine(
+        args.workers,
+        metadata=MetadataIndex(),
+        memory_budget=args.memory_budget,
+        passthrough=not args.no_passthrough,
+    )
+    try:
+        hot_folder = HotFolder(
+            args.inputs[0],
+            args.output,
+            output_format,
+            args.quality,
+            engine,
+            args.on_conflict,
+            args.max_size,
+            manifest,
+            profile=bool(args.profile),
+            encoder_profile=args.encoder_profile,
+            settle=args.settle,
+            polling=args.poll,
+            on_result=on_result,
+            variants=output_variants(args, output_format),
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    # 收到 Ctrl+C 或 SIGTERM 时等待正在转换的图片完成后再退出
+    signal.signal(signal.SIGINT, lambda *_: hot_folder.stop())
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: hot_folder.stop())
+    if args.watch_for:
+        timer = threading.Timer(args.watch_for, hot_folder.stop)
+        timer.daemon = True
+        timer.start()
+    print(f"正在监视 {args.inputs[0]}，按 Ctrl+C 结束", file=sys.stderr)
+    try:
+        stats = hot_folder.run()
+    finally:
+        if manifest is not None:
+            manifest.close()
+    report.elapsed = time.monotonic() - stats.started
+    if args.profile:
+        profile.save(args.profile)
+
+    summary = report.to_dict()
+    summary["watch"] = stats.to_dict()
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report.failed else 0
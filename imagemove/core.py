@@ -0,0 +1,1110 @@
+"""图片转换核心逻辑（不依赖 Tk，可在无界面环境和工作进程中使用）"""
+
+import hashlib
+import io
+import os
+import re
+import secrets
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PIL import ExifTags, Image
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .encoders import DEFAULT_ENCODER_PROFILE, encoder_options
+from .plugins import ensure_plugin, open_image
+from .profiling import NULL_TIMER, StageTimer, peak_rss
+from .target import TARGET_SEARCH_THREADS, encode_to_target
+from .transform import (
+    ORIENTATION_TRANSPOSE,
+    ROTATED_ORIENTATIONS,
+    TransformStep,
+    apply_step,
+    output_mode,
+    plan_transform,
+    working_mode,
+)
+
+# 常量定义
+DEFAULT_COMPRESSION = 95
+DEFAULT_WORKERS = os.cpu_count() or 1
+WECHAT_FORMAT = "朋友圈适用"
+WECHAT_SHORT_SIDE = 1080
+# 重新编码时保留 EXIF 的输出格式，其他格式会去掉 EXIF（包括 GPS 位置）
+EXIF_OUTPUT_FORMATS = ("webp", WECHAT_FORMAT)
+OUTPUT_FORMATS = ["original", "jpg", "heic", "heif", "webp", "avif", WECHAT_FORMAT]
+SUPPORTED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".heic", ".heif", ".webp", ".avif")
+CONFLICT_POLICIES = ("overwrite", "skip", "rename")
+XMP_ORIENTATION = re.compile(
+    r'tiff:Orientation="[0-9]"|<tiff:Orientation>[0-9]</tiff:Orientation>'
+)
+XMP_ORIENTATION_BYTES = re.compile(XMP_ORIENTATION.pattern.encode())
+# Linux 上克隆文件内容的 ioctl（btrfs、XFS 等支持写时复制的文件系统）
+FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+# 原子写入时临时文件的后缀
+TEMP_SUFFIX = ".imagemove-tmp"
+
+
+@dataclass(frozen=True)
+class OutputVariant:
+    """一种输出：格式、质量、最长边上限（0 为不限制）和文件名后缀"""
+
+    output_format: str
+    quality: int = DEFAULT_COMPRESSION
+    max_dimension: int = 0
+    suffix: str = ""
+
+    @property
+    def key(self):
+        return variant_key(self.output_format, self.max_dimension, self.suffix)
+
+
+@dataclass
+class ConversionJob:
+    """单张图片的转换任务（可序列化，会被发送到工作进程）"""
+
+    image_path: str
+    output_path: str
+    output_format: str
+    quality: int = DEFAULT_COMPRESSION
+    max_bytes: int = 0  # 大于 0 时按文件大小上限搜索质量，忽略 quality
+    profile: bool = False  # 记录各阶段耗时
+    encoder_profile: str = DEFAULT_ENCODER_PROFILE
+    encoder_threads: int = 0  # 每张图片的编码线程数，0 为编码器默认值
+    low_memory: bool = False  # 超出内存预算的大图：尽早释放原图，直接编码到文件
+    passthrough: str = ""  # 非空时源文件已满足输出要求，直接复制（值为原因）
+    max_dimension: int = 0  # 大于 0 时缩小到最长边不超过该值
+    suffix: str = ""  # 输出文件名后缀
+    # 同一源文件的其他输出（ConversionJob），与本任务共用一次解码
+    variants: list = field(default_factory=list)
+
+
+@dataclass
+class ConversionResult:
+    """单张图片的转换结果"""
+
+    image_path: str
+    output_path: str = ""
+    status: str = "ok"  # ok / skipped / unchanged / error
+    error: str = ""
+    elapsed: float = 0.0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    quality: int = None  # 目标大小模式下最终采用的质量
+    attempts: int = 0  # 编码次数（直接复制时为 0）
+    output_checksum: str = ""
+    cpu_time: float = 0.0
+    duplicate_of: str = ""  # 与其他输入内容相同时，实际编码的那张图片
+    saved_cpu_time: float = 0.0  # 去重后省下的编码 CPU 时间
+    stages: dict = None  # 开启 profile 时各阶段的耗时记录
+    peak_rss: int = 0  # 完成时工作进程的峰值常驻内存（字节）
+    low_memory: bool = False
+    passthrough: str = ""  # 直接复制源文件时的原因，重新编码时为空
+    payload: bytes = None  # 延后写入时尚未写入的编码结果
+    warning: str = ""  # 转换成功但需要注意的问题（如超出文件大小上限）
+    over_limit: bool = False  # 设置了文件大小上限但输出仍超出
+    variants: list = None  # job.variants 对应的结果
+
+
+@dataclass
+class BatchReport:
+    """批处理汇总"""
+
+    total: int = 0
+    converted: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    deduplicated: int = 0
+    dedup_bytes_saved: int = 0
+    dedup_cpu_saved: float = 0.0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+    target_files: list = field(default_factory=list)
+    peak_rss: int = 0  # 各工作进程峰值常驻内存的最大值（字节）
+    low_memory: int = 0  # 走低内存模式的图片数
+    over_limit: int = 0  # 最低质量也超出文件大小上限的输出数
+    warnings: list = field(default_factory=list)
+    passthrough: int = 0  # 直接复制、没有重新编码的图片数
+    pipeline: dict = field(default_factory=dict)  # 各流水线阶段的统计
+
+    def add(self, result):
+        """累计一条结果"""
+        self.peak_rss = max(self.peak_rss, result.peak_rss)
+        if result.status == "ok":
+            if result.low_memory:
+                self.low_memory += 1
+            if result.passthrough:
+                self.passthrough += 1
+            self.converted += 1
+            self.input_bytes += result.input_bytes
+            self.output_bytes += result.output_bytes
+            if result.duplicate_of:
+                self.deduplicated += 1
+                self.dedup_bytes_saved += result.input_bytes
+                self.dedup_cpu_saved += result.saved_cpu_time
+            if result.warning:
+                self.warnings.append(
+                    {"path": result.image_path, "warning": result.warning}
+                )
+            if result.quality is not None or result.over_limit:
+                self.over_limit += result.over_limit
+                self.target_files.append(
+                    {
+                        "path": result.image_path,
+                        "quality": result.quality,
+                        "attempts": result.attempts,
+                        "output_bytes": result.output_bytes,
+                        "over_limit": result.over_limit,
+                    }
+                )
+        elif result.status == "skipped":
+            self.skipped += 1
+        elif result.status == "unchanged":
+            self.unchanged += 1
+        else:
+            self.failed += 1
+            self.errors.append({"path": result.image_path, "error": result.error})
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        return {
+            "total": self.total,
+            "converted": self.converted,
+            "skipped": self.skipped,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "elapsed": round(self.elapsed, 3),
+            "deduplicated": self.deduplicated,
+            "dedup_bytes_saved": self.dedup_bytes_saved,
+            "dedup_cpu_saved": round(self.dedup_cpu_saved, 3),
+            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 1),
+            "low_memory": self.low_memory,
+            "over_limit": self.over_limit,
+            "passthrough": self.passthrough,
+            "pipeline": self.pipeline,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "target_files": self.target_files,
+        }
+
+
+def output_name(image_path, output_format, suffix=""):
+    """输出文件名"""
+    base_name = os.path.basename(image_path)
+    file_name, ext = os.path.splitext(base_name)
+    if output_format == "original":
+        return f"{file_name}{suffix}{ext}"
+    if output_format == WECHAT_FORMAT:
+        return f"{file_name}_wechat{suffix}.jpg"
+    return f"{file_name}{suffix}.{output_format}"
+
+
+def variant_key(output_format, max_dimension=0, suffix=""):
+    """区分同一源文件各个输出的键（清单中使用），只有格式时就是格式本身"""
+    if not max_dimension and not suffix:
+        return output_format
+    return f"{output_format}@{max_dimension}{suffix}"
+
+
+def job_key(job):
+    return variant_key(job.output_format, job.max_dimension, job.suffix)
+
+
+def get_output_path(image_path, output_format, output_folder):
+    """获取输出路径"""
+    return Path(output_folder) / output_name(image_path, output_format)
+
+
+def existing_names(folder):
+    """一次列出输出目录中已有的文件名（按 casefold 比较），目录不存在时返回空集合
+
+    只读取目录项，不对每个文件调用 stat，输出目录中有十万个文件时也很快。
+    统一按不区分大小写比较，在大小写不敏感的文件系统上不会漏掉冲突。
+    """
+    try:
+        with os.scandir(folder) as entries:
+            return {entry.name.casefold() for entry in entries}
+    except OSError:
+        return set()
+
+
+def find_conflicts(names, existing):
+    """返回 names 中与已有文件同名的文件名"""
+    return [name for name in names if name.casefold() in existing]
+
+
+def assign_outputs(names, policy, existing, reserved=()):
+    """按冲突策略确定一批输出文件名，返回与 names 对应的列表，None 表示跳过
+
+    existing 为输出目录中已有的文件名（见 existing_names），reserved 为本批中
+    已被占用的文件名（如清单中记录的输出）。只在内存中比较文件名，不访问磁盘。
+    同一批中多张图片得到同一个输出名时，后面的图片总是改名（name_1.ext ...），
+    避免互相覆盖；改名后的文件已存在时同样按策略处理，重复运行时结果稳定。
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"未知的冲突策略: {policy}")
+    taken = set(reserved)
+    next_index = {}  # 改名时每个文件名下一个尝试的序号
+    assigned = []
+    for name in names:
+        key = name.casefold()
+        if key in taken or (key in existing and policy == "rename"):
+            stem, ext = os.path.splitext(name)
+            index = next_index.get(key, 1)
+            while True:
+                candidate = f"{stem}_{index}{ext}"
+                candidate_key = candidate.casefold()
+                index += 1
+                if candidate_key not in taken and (
+                    policy != "rename" or candidate_key not in existing
+                ):
+                    break
+            next_index[key] = index
+            name, key = candidate, candidate_key
+        taken.add(key)
+        if key in existing and policy == "skip":
+            assigned.append(None)
+        else:
+            assigned.append(name)
+    return assigned
+
+
+def resolve_conflict(output_path, policy):
+    """按冲突策略确定单个输出路径，返回 None 表示跳过（规则与 assign_outputs 相同）"""
+    folder, name = os.path.split(os.fspath(output_path))
+    assigned = assign_outputs([name], policy, existing_names(folder or "."))[0]
+    return None if assigned is None else os.path.join(folder, assigned)
+
+
+def plan_jobs(
+    image_paths,
+    output_folder,
+    output_format,
+    quality,
+    policy="skip",
+    max_bytes=0,
+    manifest=None,
+    profile=False,
+    encoder_profile=DEFAULT_ENCODER_PROFILE,
+):
+    """生成单一输出格式的批处理任务，返回 (任务列表, 被跳过的结果列表)
+
+    见 plan_variant_jobs。
+    """
+    return plan_variant_jobs(
+        image_paths,
+        output_folder,
+        [OutputVariant(output_format, int(quality))],
+        policy,
+        max_bytes,
+        manifest,
+        profile,
+        encoder_profile,
+    )
+
+
+def plan_variant_jobs(
+    image_paths,
+    output_folder,
+    variants,
+    policy="skip",
+    max_bytes=0,
+    manifest=None,
+    profile=False,
+    encoder_profile=DEFAULT_ENCODER_PROFILE,
+    existing=None,
+):
+    """为每张图片的每种输出（OutputVariant）生成任务，返回 (任务列表, 被跳过的结果列表)
+
+    传入 manifest 时，清单中记录为最新的输出直接跳过；源文件有变化时
+    覆盖上次生成的输出，而不按冲突策略处理。
+
+    所有输出文件名先一次算好，再与一次目录列表比较找出冲突。policy 可以是
+    回调函数：有冲突时以冲突的输出路径列表调用，返回冲突策略，返回 None 表示
+    取消，此时返回 None。没有冲突时不调用。同一源文件的多个输出在任务列表中
+    相邻，由 BatchEngine 合并为一次解码。
+
+    existing 为输出目录中已有的文件名（见 existing_names），不传时列一次目录；
+    需要反复规划的调用方（如热文件夹）可以自己维护这个集合。
+    """
+    if existing is None:
+        existing = existing_names(output_folder)
+    skipped = []
+    planned = []  # (图片路径, 输出, 清单中记录的输出路径或 None, 新输出文件名)
+    for image_path in image_paths:
+        for variant in variants:
+            if manifest is not None:
+                entry = manifest.lookup(image_path, variant.key)
+                if entry is not None:
+                    if manifest.is_current(
+                        entry, variant.quality, max_bytes, encoder_profile
+                    ):
+                        skipped.append(
+                            ConversionResult(
+                                image_path,
+                                manifest.output_path(entry),
+                                status="unchanged",
+                            )
+                        )
+                        continue
+                    owned = manifest.output_path(entry)
+                    if os.path.basename(owned).casefold() in existing:
+                        planned.append((image_path, variant, owned, None))
+                        continue
+            name = output_name(image_path, variant.output_format, variant.suffix)
+            planned.append((image_path, variant, None, name))
+
+    names = [name for _, _, owned, name in planned if owned is None]
+    if callable(policy):
+        conflicts = find_conflicts(names, existing)
+        if conflicts:
+            policy = policy([os.path.join(output_folder, name) for name in conflicts])
+            if policy is None:
+                return None
+        else:
+            policy = "skip"
+    reserved = {
+        os.path.basename(owned).casefold()
+        for _, _, owned, _ in planned
+        if owned is not None
+    }
+    assigned = iter(assign_outputs(names, policy, existing, reserved))
+
+    jobs = []
+    for image_path, variant, owned, _ in planned:
+        if owned is not None:
+            output_path = owned
+        else:
+            name = next(assigned)
+            if name is None:
+                skipped.append(ConversionResult(image_path, status="skipped"))
+                continue
+            output_path = os.path.join(output_folder, name)
+        jobs.append(
+            ConversionJob(
+                image_path,
+                str(output_path),
+                variant.output_format,
+                int(variant.quality),
+                max_bytes,
+                profile,
+                encoder_profile,
+                max_dimension=variant.max_dimension,
+                suffix=variant.suffix,
+            )
+        )
+    return jobs, skipped
+
+
+def file_checksum(path, algorithm="sha1", chunk_size=1024 * 1024):
+    """流式计算文件的哈希（不解码图片）"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_orientation(img):
+    """读取 EXIF 方向（只解析元数据，不解码像素）"""
+    try:
+        return int(img.getexif().get(ExifTags.Base.Orientation, 1))
+    except Exception:
+        return 1
+
+
+def apply_orientation(img, orientation):
+    """按 EXIF 方向旋转/翻转图片"""
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+
+def exif_without_orientation(img):
+    """返回去掉方向标记后的 EXIF 数据（像素已按方向修正时使用），没有 EXIF 返回 None"""
+    if not img.info.get("exif"):
+        return None
+    exif = img.getexif()
+    exif.pop(ExifTags.Base.Orientation, None)
+    return exif.tobytes()
+
+
+def clear_orientation(img, exif_data):
+    """像素已按方向修正后，去掉 info 中的方向标记（与 ImageOps.exif_transpose 一致）
+
+    部分编码器（如 pillow_heif）会自动写入 info 中的 EXIF/XMP，
+    不清除时方向会被再次应用。
+    """
+    if exif_data:
+        img.info["exif"] = exif_data
+    else:
+        img.info.pop("exif", None)
+    for key in ("XML:com.adobe.xmp", "xmp"):
+        value = img.info.get(key)
+        if isinstance(value, bytes):
+            img.info[key] = XMP_ORIENTATION_BYTES.sub(b"", value)
+        elif isinstance(value, str):
+            img.info[key] = XMP_ORIENTATION.sub("", value)
+
+
+def wechat_size(width, height):
+    """朋友圈适用尺寸：短边缩放到 WECHAT_SHORT_SIDE"""
+    if width > height:
+        return int(width * WECHAT_SHORT_SIDE / height), WECHAT_SHORT_SIDE
+    return WECHAT_SHORT_SIDE, int(height * WECHAT_SHORT_SIDE / width)
+
+
+def target_size(width, height, output_format, max_dimension=0):
+    """修正方向后尺寸为 width×height 的图片的输出尺寸，不需要缩放时返回 None
+
+    朋友圈适用格式先把短边缩放到 WECHAT_SHORT_SIDE；max_dimension 大于 0 时
+    再等比缩小到最长边不超过该值（不放大）。
+    """
+    size = None
+    if output_format == WECHAT_FORMAT:
+        size = wechat_size(width, height)
+        width, height = size
+    if max_dimension and max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return size
+
+
+def output_pil_format(output_path, output_format):
+    """输出文件对应的 PIL 格式名"""
+    if output_format == WECHAT_FORMAT:
+        return "JPEG"
+    ext = os.path.splitext(str(output_path))[1].lower()
+    ensure_plugin(output_path)
+    pil_format = Image.registered_extensions().get(ext)
+    if pil_format is None:
+        raise ValueError(f"不支持的输出格式: {ext}")
+    return pil_format
+
+
+def decode_image(img, timer=NULL_TIMER):
+    """解码像素（Image.open 只读取文件头）"""
+    with timer.stage("decode") as stage:
+        img.load()
+        stage.pixels = img.width * img.height
+
+
+def oriented_size(img, orientation):
+    """修正方向后的尺寸"""
+    if orientation in ROTATED_ORIENTATIONS:
+        return img.height, img.width
+    return img.size
+
+
+def plan_image(img, output_format, pil_format=None, max_dimension=0):
+    """根据文件头为图片生成变换计划（见 transform.plan_transform）
+
+    按修正方向后的尺寸计算缩放目标（见 target_size）；pil_format 为 None 时不做模式转换。
+    """
+    orientation = get_orientation(img)
+    return plan_transform(
+        img.size,
+        img.mode,
+        orientation,
+        pil_format,
+        target_size(*oriented_size(img, orientation), output_format, max_dimension),
+        has_alpha=img.has_transparency_data,
+    )
+
+
+def run_plan(img, plan, timer=NULL_TIMER):
+    """解码并执行变换计划，返回 (图片, EXIF 数据)"""
+    if plan.transposes:
+        exif_data = exif_without_orientation(img)
+    else:
+        exif_data = img.info.get("exif")
+    if plan.draft_size is not None:
+        # JPEG 按 DCT 缩放解码，只在解码前有效，对其他格式没有影响
+        img.draft(None, plan.draft_size)
+    decode_image(img, timer)
+    for step in plan.steps:
+        with timer.stage(step.op) as stage:
+            img = apply_step(img, step)
+            stage.pixels = img.width * img.height
+    if plan.transposes:
+        clear_orientation(img, exif_data)
+    return img, exif_data
+
+
+def prepare_image(
+    img, output_format, timer=NULL_TIMER, pil_format=None, max_dimension=0
+):
+    """按输出格式准备待编码的图片，返回 (图片, EXIF 数据)
+
+    方向修正、缩放和模式转换合并为一个计划：先在原始方向上缩小，再在小图上
+    转换模式和修正方向；方向为 1 且不需要缩放和转换时直接返回原图，不复制像素。
+    """
+    return run_plan(
+        img, plan_image(img, output_format, pil_format, max_dimension), timer
+    )
+
+
+def prepare_variants(img, jobs, timers, low_memory=False):
+    """解码一次，为多个输出依次产出 (序号, 图片, EXIF 数据)，序号对应 jobs
+
+    先按所有输出中最大的缩小尺寸解码（JPEG draft）、缩小并修正方向，得到共用的
+    中间图（有输出保持原尺寸或放大时为原尺寸）；各输出按尺寸从大到小，从上一个
+    已缩小的中间图继续缩小，模式转换只作用在各自的输出上。共用的解码和中间图
+    记录在 timers[0]，各输出的缩放和模式转换记录在各自的 timer 上。
+    low_memory 为 True 时，得到中间图后立即释放原图像素。
+    """
+    orientation = get_orientation(img)
+    width, height = oriented_size(img, orientation)
+    sizes = [
+        target_size(width, height, job.output_format, job.max_dimension) for job in jobs
+    ]
+    areas = [w * h for w, h in (size or (width, height) for size in sizes)]
+    order = sorted(range(len(jobs)), key=areas.__getitem__, reverse=True)
+    shared_size = None
+    if all(size and size[0] < width and size[1] < height for size in sizes):
+        shared_size = sizes[order[0]]
+    has_alpha = img.has_transparency_data
+    plan = plan_transform(img.size, img.mode, orientation, None, shared_size)
+    mode = working_mode(img.mode, has_alpha)
+    if mode != img.mode:
+        # 调色板等模式不能高质量缩放，先转换为通用的模式
+        plan.steps.insert(0, TransformStep("convert", mode))
+    current, exif_data = run_plan(img, plan, timers[0])
+    if low_memory and current is not img:
+        img.close()
+
+    for index in order:
+        job, size, timer = jobs[index], sizes[index], timers[index]
+        variant = current
+        if size is not None and size != current.size:
+            with timer.stage("resize") as stage:
+                variant = apply_step(current, TransformStep("resize", size))
+                stage.pixels = variant.width * variant.height
+            if size[0] <= current.width and size[1] <= current.height:
+                # 更小的输出从这个已缩小的图继续缩小
+                current = variant
+        pil_format = output_pil_format(job.output_path, job.output_format)
+        target_mode = output_mode(variant.mode, pil_format, has_alpha)
+        if target_mode != variant.mode:
+            with timer.stage("convert") as stage:
+                variant = apply_step(variant, TransformStep("convert", target_mode))
+                stage.pixels = variant.width * variant.height
+        yield index, variant, exif_data
+
+
+def save_options(output_format, compression_quality, exif_data):
+    """img.save 的编码参数（100 表示不压缩）"""
+    if output_format == WECHAT_FORMAT:
+        options = {"format": "JPEG", "quality": compression_quality}
+    elif compression_quality < 100:
+        options = {"quality": compression_quality}
+    elif output_format == "webp":
+        options = {"quality": compression_quality, "lossless": True}
+    else:
+        options = {"lossless": True}
+    # 只有 WEBP 和朋友圈适用输出会保留 EXIF
+    if exif_data and output_format in EXIF_OUTPUT_FORMATS:
+        options["exif"] = exif_data
+    return options
+
+
+def encode_options(
+    pil_format,
+    output_format,
+    compression_quality,
+    exif_data,
+    encoder_profile=DEFAULT_ENCODER_PROFILE,
+    encoder_threads=0,
+):
+    """save_options 加上编码配置对应的编码器参数"""
+    options = save_options(output_format, compression_quality, exif_data)
+    options["format"] = pil_format
+    options.update(
+        encoder_options(
+            pil_format,
+            encoder_profile,
+            encoder_threads,
+            lossless=options.get("lossless", False),
+        )
+    )
+    return options
+
+
+def temp_output_path(output_path):
+    """与输出文件同目录的临时文件名（隐藏文件，进程号 + 随机后缀避免冲突）"""
+    directory, name = os.path.split(os.fspath(output_path))
+    return os.path.join(
+        directory, f".{name}.{os.getpid()}.{secrets.token_hex(4)}{TEMP_SUFFIX}"
+    )
+
+
+@contextmanager
+def atomic_output(output_path):
+    """先写入同目录下的临时文件，完成后用 os.replace 替换输出文件
+
+    中途出错或进程崩溃时不会留下写了一半的输出；替换的是目录项，
+    不会改写与其他输出共享的硬链接。
+    """
+    temp_path = temp_output_path(output_path)
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_output(output_path, data, timer=NULL_TIMER):
+    """把编码结果写入输出文件（也可以是可写的文件对象）"""
+    with timer.stage("write") as stage:
+        if hasattr(output_path, "write"):
+            output_path.write(data)
+        else:
+            with atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+        stage.bytes = len(data)
+
+
+def encode_image(
+    image_path,
+    output_path,
+    output_format,
+    compression_quality,
+    timer=NULL_TIMER,
+    encoder_profile=DEFAULT_ENCODER_PROFILE,
+    encoder_threads=0,
+    low_memory=False,
+    max_dimension=0,
+):
+    """解码并在内存中编码，返回编码结果（BytesIO）
+
+    low_memory 为 True 时，方向修正后立即释放原图像素，并直接编码到输出文件，
+    不在内存中保留编码结果，返回 None。
+    """
+    pil_format = output_pil_format(output_path, output_format)
+    with open_image(image_path) as source:
+        img, exif_data = prepare_image(
+            source, output_format, timer, pil_format, max_dimension
+        )
+        if low_memory and img is not source:
+            source.close()
+        options = encode_options(
+            pil_format,
+            output_format,
+            compression_quality,
+            exif_data,
+            encoder_profile,
+            encoder_threads,
+        )
+        return encode_prepared(img, output_path, options, timer, low_memory)
+
+
+def encode_prepared(img, output_path, options, timer=NULL_TIMER, low_memory=False):
+    """编码已准备好的图片，返回编码结果（BytesIO）；low_memory 时直接写入输出并返回 None"""
+    if low_memory:
+        with timer.stage("encode") as stage:
+            if hasattr(output_path, "write"):
+                img.save(output_path, **options)
+            else:
+                with atomic_output(output_path) as temp_path:
+                    img.save(temp_path, **options)
+            stage.pixels = img.width * img.height
+        return None
+    buffer = io.BytesIO()
+    with timer.stage("encode") as stage:
+        img.save(buffer, **options)
+        stage.bytes = buffer.tell()
+        stage.pixels = img.width * img.height
+    return buffer
+
+
+def save_image(
+    image_path,
+    output_path,
+    output_format,
+    compression_quality,
+    timer=NULL_TIMER,
+    encoder_profile=DEFAULT_ENCODER_PROFILE,
+    encoder_threads=0,
+    low_memory=False,
+    max_dimension=0,
+):
+    """保存图片：先在内存中编码，再一次性写入，便于分别统计编码和写入耗时"""
+    buffer = encode_image(
+        image_path,
+        output_path,
+        output_format,
+        compression_quality,
+        timer,
+        encoder_profile,
+        encoder_threads,
+        low_memory,
+        max_dimension,
+    )
+    if buffer is not None:
+        write_output(output_path, buffer.getbuffer(), timer)
+
+
+def save_image_for_wechat(
+    image_path, output_path, compression_quality, timer=NULL_TIMER
+):
+    """保存为朋友圈适用格式的图片"""
+    save_image(image_path, output_path, WECHAT_FORMAT, compression_quality, timer)
+
+
+def _reflink(src, dst):
+    """Linux 上用 FICLONE 共享数据块，不支持时返回 None"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return None
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return "reflink"
+    except OSError:
+        return None
+
+
+def _copy_file_range(src, dst):
+    """在内核中复制（网络文件系统上可以在服务端完成），不支持时返回 None"""
+    if not hasattr(os, "copy_file_range"):
+        return None
+    size = os.fstat(src.fileno()).st_size
+    copied = 0
+    try:
+        while copied < size:
+            count = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+            if count == 0:
+                break
+            copied += count
+    except OSError:
+        copied = -1
+    if copied == size:
+        return "copy_file_range"
+    src.seek(0)
+    dst.seek(0)
+    dst.truncate()
+    return None
+
+
+def fast_copy(source, target):
+    """用系统提供的最快方式复制文件（保留修改时间），返回采用的方式
+
+    依次尝试 reflink、copy_file_range，最后交给 shutil.copyfile
+    （Linux 上为 sendfile，macOS 上为 fcopyfile）。先复制到临时文件再替换目标；
+    源和目标是同一个文件时不复制，返回 None。
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return None
+    with atomic_output(target) as temp_path:
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            method = _reflink(src, dst) or _copy_file_range(src, dst)
+        if method is None:
+            shutil.copyfile(source, temp_path)
+            method = "copy"
+        shutil.copystat(source, temp_path)
+    return method
+
+
+def copy_original(job, timer=NULL_TIMER):
+    """直接复制源文件"""
+    with timer.stage("write") as stage:
+        fast_copy(job.image_path, job.output_path)
+        stage.bytes = os.path.getsize(job.output_path)
+
+
+def is_copy_job(job):
+    """任务是否直接复制源文件（不解码）"""
+    return bool(job.passthrough) or (
+        job.output_format == "original" and job.quality == 100 and not job.max_dimension
+    )
+
+
+def fits_target(job, input_bytes):
+    """目标大小模式下输出原格式且源文件不超过上限时，直接复制即可"""
+    return (
+        job.output_format == "original"
+        and not job.max_dimension
+        and input_bytes <= job.max_bytes
+    )
+
+
+def encode_image_to_target(job, image_path=None, timer=NULL_TIMER):
+    """在文件大小上限内以尽可能高的质量编码，返回 (编码结果, 质量, 尝试编码次数)
+
+    所有尝试都在内存中完成。低内存模式下逐个质量尝试，同一时间只保留一份编码结果。
+    image_path 可以是预读内容的文件对象，默认读取 job.image_path。
+    """
+    pil_format = output_pil_format(job.output_path, job.output_format)
+    with open_image(image_path or job.image_path) as source:
+        img, exif_data = prepare_image(
+            source, job.output_format, timer, pil_format, job.max_dimension
+        )
+        if job.low_memory and img is not source:
+            source.close()
+        return encode_prepared_to_target(img, exif_data, job, pil_format, timer)
+
+
+def encode_prepared_to_target(img, exif_data, job, pil_format, timer=NULL_TIMER):
+    """在文件大小上限内编码已准备好的图片，返回 (编码结果, 质量, 尝试编码次数)"""
+    with timer.stage("encode") as stage:
+        data, quality, attempts = encode_to_target(
+            img,
+            pil_format,
+            job.max_bytes,
+            lambda q: encode_options(
+                pil_format,
+                job.output_format,
+                q,
+                exif_data,
+                job.encoder_profile,
+                job.encoder_threads,
+            ),
+            threads=1 if job.low_memory else TARGET_SEARCH_THREADS,
+        )
+        stage.bytes = len(data)
+        stage.pixels = img.width * img.height * attempts
+    return data, quality, attempts
+
+
+def write_result(result):
+    """写入延后写入的编码结果（result.payload），失败时把结果标记为 error"""
+    data, result.payload = result.payload, None
+    if data is None or result.status != "ok":
+        return result
+    timer = StageTimer(result.stages) if result.stages is not None else NULL_TIMER
+    try:
+        write_output(result.output_path, data, timer)
+    except OSError as e:
+        result.status = "error"
+        result.error = str(e)
+    return result
+
+
+def finish_output(result, job, data, timer=NULL_TIMER, deferred=False):
+    """计算输出的校验和并写入（deferred 时放入 result.payload）
+
+    data 为 None 表示已直接写入输出文件。设置了文件大小上限而输出仍超出时
+    （最低质量也放不下，或格式没有质量参数），结果附带警告。
+    """
+    if data is None:
+        result.output_bytes = os.path.getsize(job.output_path)
+        with timer.stage("checksum") as stage:
+            result.output_checksum = file_checksum(job.output_path)
+            stage.bytes = result.output_bytes
+    else:
+        result.output_bytes = len(data)
+    if job.max_bytes and result.output_bytes > job.max_bytes:
+        result.over_limit = True
+        result.warning = (
+            f"输出 {result.output_bytes} 字节，超出大小上限 {job.max_bytes} 字节"
+        )
+    if data is None:
+        return
+    with timer.stage("checksum") as stage:
+        result.output_checksum = hashlib.sha1(data).hexdigest()
+        stage.bytes = result.output_bytes
+    if deferred:
+        result.payload = bytes(data)
+    else:
+        write_output(job.output_path, data, timer)
+
+
+def convert_variants(job, image_path, result, timer=NULL_TIMER, deferred=False):
+    """一次解码生成 job 及 job.variants 的所有输出，返回 job.variants 对应的结果
+
+    job 自己的结果写入 result。直接复制的输出不解码；共用的解码出错时
+    尚未完成的输出都标记为失败，单个输出编码出错只影响这个输出。
+    """
+    jobs = [job, *job.variants]
+    results = [result] + [
+        ConversionResult(variant.image_path, variant.output_path)
+        for variant in job.variants
+    ]
+    timers = [timer] + [
+        StageTimer() if variant.profile else NULL_TIMER for variant in job.variants
+    ]
+    done = set()
+    decode = []
+    for index, variant in enumerate(jobs):
+        if is_copy_job(variant) or (
+            variant.max_bytes and fits_target(variant, result.input_bytes)
+        ):
+            done.add(index)
+            try:
+                copy_original(variant, timers[index])
+                results[index].passthrough = variant.passthrough or "original"
+                finish_output(results[index], variant, None, timers[index])
+            except OSError as e:
+                results[index].status = "error"
+                results[index].error = str(e)
+        else:
+            decode.append(index)
+
+    try:
+        if decode:
+            with open_image(image_path) as source:
+                prepared = prepare_variants(
+                    source,
+                    [jobs[index] for index in decode],
+                    [timers[index] for index in decode],
+                    job.low_memory,
+                )
+                for position, img, exif_data in prepared:
+                    index = decode[position]
+                    variant, variant_result = jobs[index], results[index]
+                    done.add(index)
+                    try:
+                        pil_format = output_pil_format(
+                            variant.output_path, variant.output_format
+                        )
+                        if variant.max_bytes:
+                            data, quality, attempts = encode_prepared_to_target(
+                                img, exif_data, variant, pil_format, timers[index]
+                            )
+                            variant_result.quality = quality
+                            variant_result.attempts = attempts
+                        else:
+                            options = encode_options(
+                                pil_format,
+                                variant.output_format,
+                                variant.quality,
+                                exif_data,
+                                variant.encoder_profile,
+                                variant.encoder_threads,
+                            )
+                            buffer = encode_prepared(
+                                img,
+                                variant.output_path,
+                                options,
+                                timers[index],
+                                variant.low_memory,
+                            )
+                            data = None if buffer is None else buffer.getbuffer()
+                            variant_result.attempts = 1
+                        finish_output(
+                            variant_result, variant, data, timers[index], deferred
+                        )
+                    except Exception as e:
+                        variant_result.status = "error"
+                        variant_result.error = str(e)
+    except Exception as e:
+        for index, variant_result in enumerate(results):
+            if index not in done:
+                variant_result.status = "error"
+                variant_result.error = str(e)
+
+    for variant, variant_result, variant_timer in zip(
+        job.variants, results[1:], timers[1:]
+    ):
+        if variant.profile:
+            variant_result.stages = variant_timer.records
+        variant_result.low_memory = variant.low_memory
+    return results[1:]
+
+
+def expand_result(result):
+    """结果及其附带的同一源文件其他输出的结果（见 convert_variants）"""
+    return [result, *(result.variants or ())]
+
+
+def failed_result(job, error):
+    """任务没有返回结果（如工作进程崩溃）时，为它及同一源文件的其他输出生成 error 结果"""
+    result = ConversionResult(job.image_path, job.output_path, "error", error)
+    result.variants = [
+        ConversionResult(variant.image_path, variant.output_path, "error", error)
+        for variant in job.variants
+    ]
+    return result
+
+
+def convert_image(job, source=None, deferred=False):
+    """转换单张图片（在工作进程中执行），异常会被转换为 error 结果
+
+    source 为预读的源文件内容，None 时从磁盘读取。deferred 为 True 时编码结果
+    不写入磁盘，而是放在 result.payload 中，由调用方用 write_result 写入；
+    直接复制和低内存模式总是在这里完成写入。job.variants 非空时一次解码
+    生成所有输出，其余输出的结果放在 result.variants 中。
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = ConversionResult(job.image_path, job.output_path)
+    timer = StageTimer() if job.profile else NULL_TIMER
+    image_path = job.image_path
+    if source is not None:
+        ensure_plugin(job.image_path)
+        image_path = io.BytesIO(source)
+    try:
+        if source is not None:
+            result.input_bytes = len(source)
+        else:
+            result.input_bytes = os.path.getsize(job.image_path)
+        data = None
+        if job.variants:
+            result.variants = convert_variants(job, image_path, result, timer, deferred)
+        elif is_copy_job(job):
+            copy_original(job, timer)
+            result.passthrough = job.passthrough or "original"
+        elif job.max_bytes:
+            if fits_target(job, result.input_bytes):
+                copy_original(job, timer)
+                result.passthrough = "original"
+            else:
+                data, result.quality, result.attempts = encode_image_to_target(
+                    job, image_path, timer
+                )
+        else:
+            buffer = encode_image(
+                image_path,
+                job.output_path,
+                job.output_format,
+                job.quality,
+                timer,
+                job.encoder_profile,
+                job.encoder_threads,
+                job.low_memory,
+                job.max_dimension,
+            )
+            if buffer is not None:
+                data = buffer.getbuffer()
+            result.attempts = 1
+
+        if not job.variants:
+            finish_output(result, job, data, timer, deferred)
+    except PermissionError:
+        result.status = "error"
+        result.error = f"没有权限访问文件: {job.image_path}"
+    except Exception as e:
+        result.status = "error"
+        result.error = str(e)
+    if job.variants and result.variants is None:
+        # 还没开始解码就出错（如源文件不存在），所有输出都失败
+        result.variants = [
+            ConversionResult(
+                variant.image_path, variant.output_path, "error", result.error
+            )
+            for variant in job.variants
+        ]
+    result.elapsed = time.perf_counter() - start
+    result.cpu_time = time.process_time() - cpu_start
+    if job.profile:
+        result.stages = timer.records
+    result.peak_rss = peak_rss()
+    for item in expand_result(result):
+        item.peak_rss = result.peak_rss
+    result.low_memory = job.low_memory
+    return result
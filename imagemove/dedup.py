@@ -0,0 +1,114 @@
+"""输入去重：内容相同的图片只编码一次，其余输出用硬链接或复制生成"""
+
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .core import ConversionResult, fast_copy, file_checksum
+
+HASH_ALGORITHM = "blake2b"
+HASH_THREADS = 8
+
+
+def find_duplicates(paths):
+    """返回 {路径: 内容相同的第一个路径}，只包含重复的文件
+
+    先按文件大小分组，只有大小相同的文件才需要计算哈希；
+    哈希按块流式读取，不解码像素。
+    """
+    by_size = defaultdict(list)
+    for path in dict.fromkeys(paths):
+        try:
+            by_size[os.path.getsize(path)].append(path)
+        except OSError:
+            continue
+    candidates = [
+        path for group in by_size.values() if len(group) > 1 for path in group
+    ]
+    if not candidates:
+        return {}
+
+    def digest(path):
+        try:
+            return file_checksum(path, HASH_ALGORITHM)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=HASH_THREADS) as executor:
+        digests = dict(zip(candidates, executor.map(digest, candidates)))
+
+    first_by_digest = {}
+    duplicates = {}
+    for path in candidates:
+        value = digests[path]
+        if value is None:
+            continue
+        key = (os.path.getsize(path), value)
+        if key in first_by_digest:
+            duplicates[path] = first_by_digest[key]
+        else:
+            first_by_digest[key] = path
+    return duplicates
+
+
+def split_jobs(jobs):
+    """把任务分为需要编码的任务和重复任务 {主任务输出路径: [重复任务]}
+
+    只有源文件内容和输出参数都相同的任务才是重复任务（同一源文件的多个输出不是）。
+    """
+    duplicates = find_duplicates([job.image_path for job in jobs])
+    if not duplicates:
+        return jobs, {}
+    primary_by_source = {}
+    unique = []
+    followers = defaultdict(list)
+    for job in jobs:
+        original = duplicates.get(job.image_path, job.image_path)
+        key = (original, job.output_format, job.quality, job.max_dimension)
+        primary = primary_by_source.get(key)
+        if primary is None:
+            primary_by_source[key] = job
+            unique.append(job)
+        else:
+            followers[primary.output_path].append(job)
+    return unique, dict(followers)
+
+
+def link_or_copy(source, target):
+    """优先创建硬链接，失败时（跨设备、文件系统不支持等）用 fast_copy 复制"""
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        fast_copy(source, target)
+
+
+def materialize(primary_result, job, count_input=True):
+    """根据主任务的结果生成重复任务的输出
+
+    同一源文件有多个输出时，只有 count_input 为 True 的那个结果计入源文件大小，
+    避免省下的读取字节数按输出个数重复累计。
+    """
+    result = ConversionResult(job.image_path, job.output_path)
+    if primary_result.status != "ok":
+        result.status = primary_result.status
+        result.error = primary_result.error
+        return result
+    try:
+        link_or_copy(primary_result.output_path, job.output_path)
+        if count_input:
+            result.input_bytes = os.path.getsize(job.image_path)
+        result.output_bytes = primary_result.output_bytes
+        result.output_checksum = primary_result.output_checksum
+        result.quality = primary_result.quality
+        result.over_limit = primary_result.over_limit
+        result.warning = primary_result.warning
+        result.duplicate_of = primary_result.image_path
+        result.saved_cpu_time = primary_result.cpu_time
+    except OSError as e:
+        result.status = "error"
+        result.error = str(e)
+    return result
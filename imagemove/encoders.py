@@ -0,0 +1,90 @@
+"""编码配置：按速度和压缩率取舍的命名配置，映射为各格式编码器的参数"""
+
+from PIL import Image
+
+ENCODER_PROFILES = ("fast", "balanced", "max-compression")
+DEFAULT_ENCODER_PROFILE = "balanced"
+ENCODER_PROFILE_LABELS = {
+    "fast": "快速",
+    "balanced": "均衡",
+    "max-compression": "最高压缩",
+}
+
+# 各配置在每种格式上的设置：
+#   JPEG  optimize / progressive / subsampling（Pillow 参数）
+#   WEBP  method 0-6，越大越慢、文件越小
+#   HEIF  x265 preset 与色度抽样
+#   AVIF  编码速度 0-10（越大越快）与色度抽样
+PROFILE_SETTINGS = {
+    "fast": {
+        "JPEG": {"optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "WEBP": {"method": 0},
+        "HEIF": {"preset": "ultrafast", "chroma": 420},
+        "AVIF": {"speed": 10, "chroma": 420},
+    },
+    "balanced": {
+        "JPEG": {"optimize": True, "progressive": False},
+        "WEBP": {"method": 4},
+        "HEIF": {"preset": "fast", "chroma": 420},
+        "AVIF": {"speed": 8, "chroma": 420},
+    },
+    "max-compression": {
+        "JPEG": {"optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "WEBP": {"method": 6},
+        "HEIF": {"preset": "slower", "chroma": 420},
+        "AVIF": {"speed": 4, "chroma": 420},
+    },
+}
+
+
+def uses_pillow_heif(pil_format):
+    """该格式是否由 pillow_heif 插件编码（Pillow 11.3 起自带 AVIF 编码器）"""
+    Image.init()
+    save_handler = Image.SAVE.get(pil_format)
+    return save_handler is not None and save_handler.__module__.startswith(
+        "pillow_heif"
+    )
+
+
+def encoder_options(
+    pil_format, profile=DEFAULT_ENCODER_PROFILE, threads=0, lossless=False
+):
+    """返回指定配置下 img.save 的额外参数
+
+    threads 为每张图片的编码线程数（0 表示使用编码器默认值），
+    无损输出时不做色度抽样。每次调用都返回新的字典（pillow_heif 会修改传入的 enc_params）。
+    """
+    if profile not in PROFILE_SETTINGS:
+        raise ValueError(f"未知的编码配置: {profile}")
+    settings = PROFILE_SETTINGS[profile].get(pil_format)
+    if settings is None:
+        return {}
+
+    if pil_format == "JPEG":
+        return dict(settings)
+    if pil_format == "WEBP":
+        return {"method": settings["method"]}
+
+    options = {}
+    if pil_format == "HEIF" or uses_pillow_heif(pil_format):
+        # libheif 编码器参数均为字符串
+        if pil_format == "HEIF":
+            enc_params = {"preset": settings["preset"]}
+            if threads:
+                enc_params["x265:pools"] = str(threads)
+        else:
+            enc_params = {"speed": str(min(settings["speed"], 9))}
+            if threads:
+                enc_params["threads"] = str(threads)
+        options["enc_params"] = enc_params
+        if not lossless:
+            options["chroma"] = settings["chroma"]
+    else:
+        # Pillow 自带的 AVIF 编码器
+        options["speed"] = settings["speed"]
+        if threads:
+            options["max_threads"] = threads
+        if not lossless:
+            chroma = str(settings["chroma"])
+            options["subsampling"] = f"4:{chroma[1]}:{chroma[2]}"
+    return options
@@ -0,0 +1,264 @@
+"""多进程批量转换引擎"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+
+from .core import (
+    DEFAULT_WORKERS,
+    convert_image,
+    expand_result,
+    failed_result,
+    is_copy_job,
+)
+from .dedup import materialize, split_jobs
+from .memory import (
+    WORKER_BASE_MEMORY,
+    default_memory_budget,
+    estimate_group_memory,
+    estimate_job_memory,
+)
+from .metadata import MetadataIndex
+from .passthrough import passthrough_reason
+from .pipeline import (
+    READ_AHEAD_PER_WORKER,
+    WRITE_BACKLOG_PER_WORKER,
+    OutputWriter,
+    PipelineStats,
+    ReadAhead,
+)
+
+
+class BatchEngine:
+    """把转换任务分发到进程池，按完成顺序返回结果
+
+    dedup 为 True 时，内容相同的输入只编码一次，其余输出由硬链接或复制生成。
+
+    派发前根据文件头（metadata 为 MetadataIndex，不传时只在本次运行中缓存）
+    估算每个任务的峰值内存：按估算值从大到小派发，避免最大的图片最后才开始；
+    同时运行的任务估算总和不超过 memory_budget，单独就超出预算的任务
+    走低内存模式，并且独占运行。
+
+    passthrough 为 True 时，文件头表明已满足输出要求的输入直接复制，
+    在当前进程中完成，不占用工作进程和内存预算。
+
+    同一源文件的多个输出（如 JPG、WEBP 和朋友圈适用）合并为一个任务，
+    在同一个工作进程中只读取和解码一次。
+
+    处理分为三个重叠的阶段：后台线程预读即将派发的源文件，工作进程从内存中
+    解码和编码，编码结果交给写入线程通过临时文件 + os.replace 写入。
+    各阶段的忙碌/空闲时间和队列深度记录在 pipeline 中。
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        dedup=False,
+        metadata=None,
+        memory_budget=0,
+        passthrough=True,
+    ):
+        self.max_workers = max(1, max_workers or DEFAULT_WORKERS)
+        self.dedup = dedup
+        self.passthrough = passthrough
+        self.metadata = metadata
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.cancelled = False
+        self.peak_memory_estimate = 0  # 同时运行的任务估算内存之和的最大值
+        self.pipeline = PipelineStats()  # 最近一次运行各流水线阶段的统计
+
+    def cancel(self):
+        """停止派发尚未开始的任务"""
+        self.cancelled = True
+
+    def run(self, jobs):
+        """执行任务，逐个产出 ConversionResult"""
+        if not self.dedup:
+            yield from self._run(jobs)
+            return
+        unique, followers = split_jobs(jobs)
+        counted = set()  # 已计入源文件大小的重复输入
+        for result in self._run(unique):
+            yield result
+            for job in followers.get(result.output_path, ()):
+                yield materialize(result, job, job.image_path not in counted)
+                counted.add(job.image_path)
+
+    def plan_memory(self, jobs):
+        """估算每个任务的峰值内存，返回按估算值从大到小排序的 [(任务, 估算值)]
+
+        超出预算的任务改为低内存模式，读取不到文件头的任务按最小值估算；
+        可以直接复制的任务标记 passthrough。同一源文件需要解码的多个输出
+        合并为一个任务（其余输出放在 job.variants 中），按一次解码估算。
+        """
+        metadata = self.metadata or MetadataIndex(":memory:")
+        info = metadata.get_many([job.image_path for job in jobs])
+        planned = []
+        groups = {}  # 源文件 -> [任务列表, 估算值列表]
+        for job in jobs:
+            meta = info.get(job.image_path)
+            if self.passthrough and meta is not None and not job.passthrough:
+                reason = passthrough_reason(job, meta)
+                if reason:
+                    job = replace(job, passthrough=reason)
+            estimate = (
+                estimate_job_memory(job, meta)
+                if meta is not None
+                else WORKER_BASE_MEMORY
+            )
+            if is_copy_job(job):
+                planned.append((job, estimate))
+                continue
+            group = groups.setdefault(job.image_path, [[], []])
+            group[0].append(job)
+            group[1].append(estimate)
+        for group_jobs, estimates in groups.values():
+            if len(group_jobs) == 1:
+                planned.append((group_jobs[0], estimates[0]))
+            else:
+                planned.append(
+                    (
+                        replace(group_jobs[0], variants=group_jobs[1:]),
+                        estimate_group_memory(estimates),
+                    )
+                )
+
+        budgeted = []
+        for job, estimate in planned:
+            if estimate > self.memory_budget and not job.low_memory:
+                job = replace(
+                    job,
+                    low_memory=True,
+                    variants=[
+                        replace(variant, low_memory=True) for variant in job.variants
+                    ],
+                )
+            budgeted.append((job, min(estimate, self.memory_budget)))
+        budgeted.sort(key=lambda item: item[1], reverse=True)
+        return budgeted
+
+    def assign_threads(self, jobs):
+        """按同时运行的图片数分配编码线程，使 进程数 × 编码线程数 不超过 CPU 核数"""
+        parallel = max(1, min(self.max_workers, len(jobs)))
+        threads = max(1, (os.cpu_count() or 1) // parallel)
+        return [
+            job if job.encoder_threads else replace(job, encoder_threads=threads)
+            for job in jobs
+        ]
+
+    def _run(self, jobs):
+        self.cancelled = False
+        jobs = self.assign_threads(jobs)
+        self.peak_memory_estimate = 0
+        self.pipeline = PipelineStats()
+        pending = []
+        for job, estimate in self.plan_memory(jobs):
+            if not job.passthrough:
+                pending.append((job, estimate))
+                continue
+            # 直接复制不需要解码，在当前进程中完成
+            if self.cancelled:
+                return
+            yield from expand_result(convert_image(job))
+
+        if not pending:
+            return
+
+        # 预读和写入在后台线程中与计算重叠；直接复制和低内存模式的任务不预读
+        self.pipeline.workers = min(self.max_workers, len(pending))
+        read_ahead = ReadAhead(
+            [
+                job.image_path
+                for job, _ in pending
+                if not job.low_memory and not is_copy_job(job)
+            ],
+            self.max_workers * READ_AHEAD_PER_WORKER,
+            stats=self.pipeline.read,
+        )
+        writer = OutputWriter(self.pipeline.write)
+        try:
+            if self.max_workers == 1 or len(pending) <= 1:
+                yield from self._run_inline(pending, read_ahead, writer)
+            else:
+                yield from self._run_pool(pending, read_ahead, writer)
+            yield from writer.drain()
+        finally:
+            read_ahead.close()
+            writer.close()
+            self.pipeline.finish()
+
+    def _run_inline(self, pending, read_ahead, writer):
+        """单进程时直接在当前进程执行，省去进程启动开销"""
+        for job, estimate in pending:
+            if self.cancelled:
+                break
+            self.peak_memory_estimate = max(self.peak_memory_estimate, estimate)
+            self.pipeline.work.sample(1)
+            result = convert_image(job, read_ahead.take(job.image_path), deferred=True)
+            self.pipeline.add_result(result)
+            for item in expand_result(result):
+                writer.submit(item)
+            yield from writer.completed()
+
+    def _run_pool(self, pending, read_ahead, writer):
+        """工作进程崩溃（如被系统 OOM 终止、编解码器段错误）时，对应的任务记为失败；
+        进程池因此不能再派发时，其余排队的任务也记为失败，批处理照常结束"""
+        running = {}  # future -> (任务, 估算内存)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while (pending or running) and not self.cancelled:
+                    try:
+                        self.admit(executor, pending, running, read_ahead, writer)
+                    except BrokenProcessPool as e:
+                        for job, _ in pending:
+                            for item in expand_result(failed_result(job, str(e))):
+                                writer.submit(item)
+                        pending.clear()
+                    wait(
+                        [*running, *writer.pending],
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in [future for future in running if future.done()]:
+                        job, _ = running.pop(future)
+                        if self.cancelled:
+                            break
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = failed_result(job, str(e) or type(e).__name__)
+                        self.pipeline.add_result(result)
+                        for item in expand_result(result):
+                            writer.submit(item)
+                    yield from writer.completed()
+            finally:
+                for future in running:
+                    future.cancel()
+
+    def admit(self, executor, pending, running, read_ahead, writer):
+        """在进程数和内存预算允许时派发任务
+
+        依次检查排队的任务，跳过暂时放不下的大图，先派发放得下的小图；
+        没有任务在运行时总是派发下一个，保证超出预算的任务也能执行。
+        待写入的结果积压过多（磁盘跟不上）时暂停派发。
+        """
+        used = sum(estimate for _, estimate in running.values())
+        backlog = self.max_workers * WRITE_BACKLOG_PER_WORKER
+        index = 0
+        while (
+            index < len(pending)
+            and len(running) < self.max_workers
+            and writer.depth < backlog
+        ):
+            job, estimate = pending[index]
+            if running and used + estimate > self.memory_budget:
+                index += 1
+                continue
+            future = executor.submit(
+                convert_image, job, read_ahead.take(job.image_path), True
+            )
+            del pending[index]
+            running[future] = (job, estimate)
+            used += estimate
+            self.pipeline.work.sample(len(running))
+            self.peak_memory_estimate = max(self.peak_memory_estimate, used)
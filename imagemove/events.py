@@ -0,0 +1,73 @@
+"""工作线程与界面线程之间的事件通道，以及吞吐量统计"""
+
+import queue
+import time
+
+
+class EventChannel:
+    """线程安全的事件队列
+
+    工作线程调用 post() 投递事件，界面线程定时调用 drain() 一次取走全部事件，
+    合并后再刷新界面，避免每处理一张图片就重绘一次。
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def post(self, kind, payload=None):
+        """投递一个事件（任何线程都可以调用）"""
+        self._queue.put((kind, payload))
+
+    def drain(self):
+        """取出当前排队的所有事件"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class ThroughputMeter:
+    """统计处理速度（张/秒、MB/秒）并估算剩余时间"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+
+    def add(self, count=1, nbytes=0):
+        self.done += count
+        self.bytes += nbytes
+
+    @property
+    def elapsed(self):
+        return max(time.perf_counter() - self.start, 1e-6)
+
+    @property
+    def images_per_second(self):
+        return self.done / self.elapsed
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / self.elapsed / (1024 * 1024)
+
+    @property
+    def eta(self):
+        """剩余秒数，尚无法估算时返回 None"""
+        if not self.done:
+            return None
+        return (self.total - self.done) / self.images_per_second
+
+
+def format_duration(seconds):
+    """把秒数格式化为 h:mm:ss 或 m:ss"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,132 @@
+"""输出目录中的批处理清单，用于续跑时跳过未变化的图片"""
+
+import json
+import os
+import tempfile
+import threading
+
+from .core import job_key
+from .encoders import DEFAULT_ENCODER_PROFILE
+
+MANIFEST_NAME = ".imagemove-manifest.jsonl"
+
+
+class BatchManifest:
+    """记录每个输出对应的源文件状态、编码参数和输出校验和
+
+    清单按行追加写入（每完成一张就落盘），批处理中断后已完成的部分仍然有效；
+    读取时同一个键以最后一行为准。判断是否需要重新处理时只比较 stat 信息，
+    不打开源文件和输出文件。
+    """
+
+    def __init__(self, output_folder):
+        self.output_folder = str(output_folder)
+        self.path = os.path.join(self.output_folder, MANIFEST_NAME)
+        self.entries = {}
+        self._lines = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(image_path, variant):
+        return f"{os.path.abspath(image_path)}|{variant}"
+
+    def load(self):
+        """读取清单，忽略中断时可能留下的不完整行"""
+        self.entries = {}
+        self._lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = self.key(
+                            entry["source"],
+                            entry.get("variant", entry["output_format"]),
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self.entries[key] = entry
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+
+    def lookup(self, image_path, variant):
+        """查找某个源文件在指定输出下的记录，variant 为输出格式或 OutputVariant.key"""
+        return self.entries.get(self.key(image_path, variant))
+
+    def output_path(self, entry):
+        """记录中的输出文件路径"""
+        return os.path.join(self.output_folder, entry["output"])
+
+    def is_current(
+        self, entry, quality, max_bytes=0, encoder_profile=DEFAULT_ENCODER_PROFILE
+    ):
+        """源文件和输出文件都没有变化，且编码参数相同"""
+        if entry.get("quality") != quality or entry.get("max_bytes", 0) != max_bytes:
+            return False
+        if entry.get("encoder_profile", DEFAULT_ENCODER_PROFILE) != encoder_profile:
+            return False
+        try:
+            source = os.stat(entry["source"])
+            output = os.stat(self.output_path(entry))
+        except OSError:
+            return False
+        return (
+            source.st_size == entry["source_size"]
+            and source.st_mtime_ns == entry["source_mtime_ns"]
+            and output.st_size == entry["output_size"]
+            and output.st_mtime_ns == entry["output_mtime_ns"]
+        )
+
+    def record(self, job, result):
+        """记录一次成功的转换并立即写入磁盘"""
+        try:
+            source = os.stat(job.image_path)
+            output = os.stat(result.output_path)
+        except OSError:
+            return
+        entry = {
+            "source": os.path.abspath(job.image_path),
+            "source_size": source.st_size,
+            "source_mtime_ns": source.st_mtime_ns,
+            "output_format": job.output_format,
+            "variant": job_key(job),
+            "quality": job.quality,
+            "max_bytes": job.max_bytes,
+            "encoder_profile": job.encoder_profile,
+            "output": os.path.relpath(result.output_path, self.output_folder),
+            "output_size": output.st_size,
+            "output_mtime_ns": output.st_mtime_ns,
+            "output_checksum": result.output_checksum,
+        }
+        with self._lock:
+            self.entries[self.key(job.image_path, job_key(job))] = entry
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._lines += 1
+
+    def close(self):
+        """关闭清单；重复记录较多时压缩为每个键一行"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lines > 2 * len(self.entries) + 100:
+                self._compact()
+
+    def _compact(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self.entries)
+        except OSError as e:
+            print(f"压缩批处理清单失败: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
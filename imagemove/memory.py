@@ -0,0 +1,128 @@
+"""内存预算：根据文件头估算每个任务的峰值内存"""
+
+import os
+
+from .core import ROTATED_ORIENTATIONS, output_pil_format, target_size
+from .target import TARGET_SEARCH_THREADS
+from .transform import plan_transform
+
+# 工作进程本身（解释器、Pillow、编码库）占用的内存
+WORKER_BASE_MEMORY = 64 * 1024 * 1024
+# 无法读取物理内存大小时使用的预算
+FALLBACK_MEMORY_BUDGET = 4 * 1024**3
+# 默认预算占物理内存的比例
+DEFAULT_BUDGET_FRACTION = 0.5
+# JPEG draft 可用的缩放倍数
+JPEG_DRAFT_SCALES = (8, 4, 2)
+
+
+def bytes_per_pixel(mode):
+    """Pillow 内部存储每个像素占用的字节数（多通道 8 位图片按 4 字节对齐）"""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def physical_memory():
+    """物理内存大小（字节），无法获取时返回 None"""
+    try:
+        if os.name == "nt":
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(MemoryStatus)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return int(status.ullTotalPhys)
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def default_memory_budget():
+    """默认内存预算：物理内存的一半"""
+    total = physical_memory()
+    if not total:
+        return FALLBACK_MEMORY_BUDGET
+    return int(total * DEFAULT_BUDGET_FRACTION)
+
+
+def draft_size(meta, size):
+    """JPEG 按 DCT 缩放解码后的尺寸（与 Image.draft 的选择方式一致）"""
+    if meta.format != "JPEG":
+        return meta.width, meta.height
+    for scale in JPEG_DRAFT_SCALES:
+        width = -(-meta.width // scale)
+        height = -(-meta.height // scale)
+        if width >= size[0] and height >= size[1]:
+            return width, height
+    return meta.width, meta.height
+
+
+def estimate_job_memory(job, meta):
+    """估算一个转换任务的峰值内存（字节），meta 为文件头信息（ImageMetadata）
+
+    按与转换时相同的变换计划逐步推算：每一步同时持有输入和输出两份图片，
+    编码时另需约半幅图片的工作内存；JPEG 缩小时按 DCT 缩放后的尺寸解码。
+    目标大小模式另外要容纳各搜索线程的图片副本和并行编码的多份结果。
+    """
+    width, height = meta.width, meta.height
+    if meta.orientation in ROTATED_ORIENTATIONS:
+        width, height = height, width
+    try:
+        pil_format = output_pil_format(job.output_path, job.output_format)
+    except ValueError:
+        pil_format = None
+    plan = plan_transform(
+        (meta.width, meta.height),
+        meta.mode,
+        meta.orientation,
+        pil_format,
+        target_size(width, height, job.output_format, job.max_dimension),
+    )
+
+    size = (meta.width, meta.height)
+    if plan.draft_size is not None:
+        size = draft_size(meta, plan.draft_size)
+    mode = meta.mode
+    current = size[0] * size[1] * bytes_per_pixel(mode)
+    peak = current
+    for step in plan.steps:
+        if step.op == "resize":
+            size = step.arg
+        elif step.op == "convert":
+            mode = step.arg
+        output = size[0] * size[1] * bytes_per_pixel(mode)
+        peak = max(peak, current + output)
+        current = output
+    peak = max(peak, current * 1.5)
+    if job.max_bytes:
+        peak += current * 1.25 * TARGET_SEARCH_THREADS
+    return int(peak) + WORKER_BASE_MEMORY
+
+
+def estimate_group_memory(estimates):
+    """同一源文件多个输出一次解码时的峰值内存，estimates 为各输出单独转换时的估算值
+
+    原图只解码一次，其余输出从已缩小的中间图生成，只多出各自的输出图片，
+    按单独估算值（去掉工作进程本身）的一半计算。
+    """
+    largest = max(estimates)
+    extra = sum(estimate - WORKER_BASE_MEMORY for estimate in estimates) - (
+        largest - WORKER_BASE_MEMORY
+    )
+    return largest + extra // 2
@@ -0,0 +1,208 @@
+"""图片元数据索引：只读取文件头（不解码像素），结果保存在本地 SQLite 中
+
+索引以 路径 + 修改时间 + 文件大小 为键，文件变化后自动重新读取，可跨会话复用。
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass
+
+from PIL import ExifTags
+
+from .core import ROTATED_ORIENTATIONS, get_orientation
+from .plugins import open_image
+from .thumbcache import user_cache_dir
+
+METADATA_DB_NAME = "metadata.sqlite"
+METADATA_WORKERS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    format TEXT NOT NULL,
+    orientation INTEGER NOT NULL,
+    captured TEXT NOT NULL,
+    quality INTEGER NOT NULL,
+    has_exif INTEGER NOT NULL
+)
+"""
+# IJG 标准亮度量化表（质量 50），用于估算 JPEG 的压缩质量
+STANDARD_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)  # fmt: skip
+
+
+@dataclass
+class ImageMetadata:
+    """一张图片的文件头信息（字段顺序与数据表一致）"""
+
+    path: str
+    mtime_ns: int
+    size: int
+    width: int
+    height: int
+    mode: str
+    format: str
+    orientation: int = 1
+    captured: str = ""  # 拍摄时间，ISO 格式，没有时为空
+    quality: int = 0  # 按量化表估算的 JPEG 质量，其他格式或无法估算时为 0
+    has_exif: bool = False  # 文件中有 EXIF（可能包含 GPS 位置）
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    @property
+    def display_size(self):
+        """按 EXIF 方向修正后的 (宽, 高)"""
+        if self.orientation in ROTATED_ORIENTATIONS:
+            return self.height, self.width
+        return self.width, self.height
+
+
+def capture_date(img):
+    """从 EXIF 读取拍摄时间（DateTimeOriginal，没有时用 DateTime），转换为 ISO 格式"""
+    try:
+        exif = img.getexif()
+        value = exif.get_ifd(ExifTags.IFD.Exif).get(
+            ExifTags.Base.DateTimeOriginal
+        ) or exif.get(ExifTags.Base.DateTime)
+    except Exception:
+        return ""
+    if not isinstance(value, str) or len(value) < 19:
+        return ""
+    # EXIF 格式为 "YYYY:MM:DD HH:MM:SS"
+    return value[:10].replace(":", "-") + "T" + value[11:19]
+
+
+def jpeg_quality(img):
+    """按亮度量化表相对 IJG 标准表的缩放比例估算 JPEG 质量（1-100），无法估算时返回 0"""
+    tables = getattr(img, "quantization", None)
+    if img.format != "JPEG" or not tables or 0 not in tables:
+        return 0
+    scale = sum(tables[0]) * 100 / sum(STANDARD_LUMINANCE_TABLE)
+    if scale <= 100:
+        quality = (200 - scale) / 2
+    else:
+        quality = 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def read_metadata(path, stat=None):
+    """只解析文件头读取元数据（Image.open 是惰性的，不调用 load）"""
+    stat = stat or os.stat(path)
+    with open_image(path) as img:
+        return ImageMetadata(
+            str(path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            img.width,
+            img.height,
+            img.mode,
+            img.format or "",
+            get_orientation(img),
+            capture_date(img),
+            jpeg_quality(img),
+            bool(img.info.get("exif")),
+        )
+
+
+class MetadataIndex:
+    """以 SQLite 保存的元数据索引，可在多个线程中使用"""
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(user_cache_dir(), METADATA_DB_NAME)
+        self._lock = threading.Lock()
+        try:
+            if db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._create_table()
+        except (OSError, sqlite3.Error) as e:
+            # 缓存目录不可写时退回到内存数据库，只在本次运行中复用
+            print(f"无法打开元数据索引 {db_path}: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_table()
+
+    def _create_table(self):
+        """建表；旧版本的索引缺少字段时直接重建（索引只是缓存）"""
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(images)")]
+        if columns and columns != list(ImageMetadata.__dataclass_fields__):
+            self._db.execute("DROP TABLE images")
+        self._db.execute(SCHEMA)
+
+    def lookup(self, path, stat):
+        """返回与当前文件状态一致的索引记录，没有或已过期时返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM images WHERE path = ?", (str(path),)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = ImageMetadata(*row)
+        if entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+            return None
+        return entry
+
+    def store(self, entries):
+        """写入（或更新）一批记录"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [astuple(entry) for entry in entries],
+            )
+
+    def get(self, path):
+        """读取一张图片的元数据，无法读取时返回 None"""
+        return self.get_many([path]).get(str(path))
+
+    def get_many(self, paths, workers=METADATA_WORKERS):
+        """批量读取元数据，返回 {路径: ImageMetadata}，无法读取的图片不在结果中
+
+        未命中的文件在线程池中读取文件头（网络存储上主要是 I/O 等待），
+        结果在一个事务中写回索引。
+        """
+        found = {}
+        missing = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.lookup(path, stat)
+            if entry is None:
+                missing.append((path, stat))
+            else:
+                found[entry.path] = entry
+
+        def read(item):
+            try:
+                return read_metadata(*item)
+            except Exception:
+                return None
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+                entries = [entry for entry in pool.map(read, missing) if entry]
+            self.store(entries)
+            found.update((entry.path, entry) for entry in entries)
+        return found
+
+    def close(self):
+        with self._lock:
+            self._db.close()
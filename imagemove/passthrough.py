@@ -0,0 +1,65 @@
+"""直通规则：根据文件头判断输入是否已经满足输出要求，满足时直接复制而不重新编码
+
+重新编码同一种有损格式既耗时又会再损失一次画质；这些规则只使用
+ImageMetadata（不解码像素），在派发任务前判断。只有重新编码不能让文件
+更小时才直接复制：质量为 100（不压缩），或 JPEG 源文件按量化表估算的质量
+不高于目标质量，且编码配置不是最高压缩。直接复制会原样保留 EXIF，
+所以重新编码会去掉 EXIF 的输出格式不复制带 EXIF 的源文件，
+否则是否泄露 GPS 位置将取决于源文件的量化表。
+"""
+
+from .core import (
+    EXIF_OUTPUT_FORMATS,
+    WECHAT_FORMAT,
+    WECHAT_SHORT_SIDE,
+    output_pil_format,
+)
+from .transform import ENCODABLE_MODES
+
+# 朋友圈适用输出可以直接使用的 JPEG 模式
+WECHAT_MODES = ("RGB", "L")
+# 这些编码配置下质量相同也可能重新编码得更小，不直接复制
+RECOMPRESS_PROFILES = ("max-compression",)
+
+
+def compression_allows_copy(job, meta):
+    """按目标质量判断重新编码能否让文件更小，不能时返回 True"""
+    if job.quality >= 100:
+        return True
+    if job.encoder_profile in RECOMPRESS_PROFILES:
+        return False
+    return meta.format == "JPEG" and 0 < meta.quality <= job.quality
+
+
+def passthrough_reason(job, meta):
+    """输入可以直接复制时返回原因（same-format / wechat），否则返回空字符串
+
+    条件：不需要修正方向；源文件已是输出格式且模式可以直接编码；
+    重新编码不能进一步压缩（见 compression_allows_copy）；
+    源文件有 EXIF 时，只有重新编码同样保留 EXIF 的输出格式才能复制；
+    设置了大小上限时源文件不超过上限，设置了最长边上限时不需要缩小；朋友圈适用输出还要求短边不超过
+    WECHAT_SHORT_SIDE（否则需要缩小）。
+    """
+    if meta.orientation != 1:
+        return ""
+    if meta.has_exif and job.output_format not in EXIF_OUTPUT_FORMATS:
+        return ""
+    if job.max_bytes and meta.size > job.max_bytes:
+        return ""
+    if job.max_dimension and max(meta.width, meta.height) > job.max_dimension:
+        return ""
+    try:
+        pil_format = output_pil_format(job.output_path, job.output_format)
+    except ValueError:
+        return ""
+    if meta.format != pil_format:
+        return ""
+    if not compression_allows_copy(job, meta):
+        return ""
+    if job.output_format == WECHAT_FORMAT:
+        if min(meta.width, meta.height) > WECHAT_SHORT_SIDE:
+            return ""
+        return "wechat" if meta.mode in WECHAT_MODES else ""
+    if meta.mode not in ENCODABLE_MODES.get(pil_format, (meta.mode,)):
+        return ""
+    return "same-format"
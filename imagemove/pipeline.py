@@ -0,0 +1,213 @@
+"""流水线阶段：预读源文件 → 工作进程解码/编码 → 写入输出
+
+预读和写入在后台线程中进行，与工作进程的计算重叠：慢速磁盘或 NAS 上
+读取下一批文件时 CPU 不必空等，编码时磁盘也在写入上一批结果。
+各阶段记录忙碌时间、空闲时间和队列深度。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from .core import write_result
+
+# 每个工作进程预读的文件数
+READ_AHEAD_PER_WORKER = 2
+# 预读缓存的字节数上限
+READ_AHEAD_BYTES = 256 * 1024 * 1024
+# 每个工作进程最多积压的待写入结果数，超出时暂停派发
+WRITE_BACKLOG_PER_WORKER = 2
+
+
+@dataclass
+class StageStats:
+    """一个阶段的统计：忙碌/空闲时间（秒）、处理数量、字节数和队列深度"""
+
+    busy: float = 0.0
+    idle: float = 0.0
+    items: int = 0
+    bytes: int = 0
+    max_queue: int = 0
+    queue_total: int = 0
+    queue_samples: int = 0
+
+    def sample(self, depth):
+        """记录一次队列深度"""
+        self.max_queue = max(self.max_queue, depth)
+        self.queue_total += depth
+        self.queue_samples += 1
+
+    def to_dict(self):
+        mean_queue = self.queue_total / self.queue_samples if self.queue_samples else 0
+        return {
+            "busy_s": round(self.busy, 3),
+            "idle_s": round(self.idle, 3),
+            "items": self.items,
+            "bytes": self.bytes,
+            "max_queue": self.max_queue,
+            "mean_queue": round(mean_queue, 2),
+        }
+
+
+@dataclass
+class PipelineStats:
+    """一次批处理中预读、计算和写入三个阶段的统计
+
+    空闲时间为阶段的可用时间减去忙碌时间；计算阶段的可用时间为
+    工作进程数 × 总耗时，队列深度为同时运行的任务数。
+    """
+
+    workers: int = 1
+    elapsed: float = 0.0
+    read: StageStats = field(default_factory=StageStats)
+    work: StageStats = field(default_factory=StageStats)
+    write: StageStats = field(default_factory=StageStats)
+    started: float = field(default_factory=time.perf_counter)
+
+    def add_result(self, result):
+        """累计工作进程完成的一张图片"""
+        self.work.busy += result.elapsed
+        self.work.items += 1
+        self.work.bytes += result.input_bytes
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.read.idle = max(0.0, self.elapsed - self.read.busy)
+        self.work.idle = max(0.0, self.elapsed * self.workers - self.work.busy)
+        self.write.idle = max(0.0, self.elapsed - self.write.busy)
+
+    def to_dict(self):
+        return {
+            "workers": self.workers,
+            "elapsed": round(self.elapsed, 3),
+            "read": self.read.to_dict(),
+            "work": self.work.to_dict(),
+            "write": self.write.to_dict(),
+        }
+
+
+class ReadAhead:
+    """预读阶段：后台线程按派发顺序把源文件读入内存
+
+    最多缓存 max_files 个文件、max_bytes 字节，缓存满时等待取走。
+    取走的内容随任务发送给工作进程；还没读到的文件由工作进程自己读取，
+    所以派发顺序与预读顺序不一致（内存预算跳过大图）时也不会阻塞。
+    """
+
+    def __init__(self, paths, max_files, max_bytes=READ_AHEAD_BYTES, stats=None):
+        self.max_files = max(1, max_files)
+        self.max_bytes = max_bytes
+        self.stats = stats or StageStats()
+        self._queue = deque(paths)
+        self._buffers = {}
+        self._taken = set()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="imagemove-read-ahead", daemon=True
+        )
+        if self._queue:
+            self._thread.start()
+
+    def _full(self):
+        return len(self._buffers) >= self.max_files or self._size >= self.max_bytes
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._queue and self._full():
+                    self._cond.wait()
+                if self._closed or not self._queue:
+                    return
+                path = self._queue.popleft()
+                if path in self._taken:
+                    continue
+            start = time.perf_counter()
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                # 由工作进程读取并报告错误
+                continue
+            finally:
+                self.stats.busy += time.perf_counter() - start
+            with self._cond:
+                if self._closed or path in self._taken:
+                    continue
+                self._buffers[path] = data
+                self._size += len(data)
+                self.stats.items += 1
+                self.stats.bytes += len(data)
+                self.stats.sample(len(self._buffers))
+
+    def take(self, path):
+        """取出预读的内容，尚未读到时返回 None（不等待）"""
+        with self._cond:
+            self._taken.add(path)
+            data = self._buffers.pop(path, None)
+            if data is not None:
+                self._size -= len(data)
+                self._cond.notify_all()
+            return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._buffers.clear()
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class OutputWriter:
+    """写入阶段：单个后台线程把延后写入的编码结果写入输出文件
+
+    写入通过临时文件 + os.replace 完成（见 core.write_result），
+    完成的结果按提交顺序取出。
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats or StageStats()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="imagemove-writer"
+        )
+        self.pending = {}  # future -> None，保持提交顺序
+
+    @property
+    def depth(self):
+        return len(self.pending)
+
+    def submit(self, result):
+        future = self._executor.submit(self._write, result)
+        self.pending[future] = None
+        self.stats.sample(len(self.pending))
+
+    def _write(self, result):
+        if result.payload is None:
+            return result
+        size = len(result.payload)
+        start = time.perf_counter()
+        try:
+            return write_result(result)
+        finally:
+            self.stats.busy += time.perf_counter() - start
+            self.stats.items += 1
+            self.stats.bytes += size
+
+    def completed(self):
+        """产出已写完的结果（不等待）"""
+        for future in [future for future in self.pending if future.done()]:
+            del self.pending[future]
+            yield future.result()
+
+    def drain(self):
+        """等待并产出所有剩余的结果"""
+        while self.pending:
+            wait(self.pending, return_when=FIRST_COMPLETED)
+            yield from self.completed()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,89 @@
+"""按需注册 HEIF/AVIF 支持：第一次打开或输出这类文件时才导入 pillow_heif
+
+pillow_heif 及其编解码库体积较大，放到首次使用时加载可以缩短启动时间；
+工作进程也只在真正处理 HEIF/AVIF 时才加载。
+"""
+
+import os
+import sys
+import threading
+
+from PIL import Image, UnidentifiedImageError, features
+
+HEIF_EXTENSIONS = (".heic", ".heif", ".hif")
+AVIF_EXTENSIONS = (".avif",)
+
+_lock = threading.Lock()
+_available = {}  # "heif" / "avif" -> 是否可用
+
+
+def pillow_has_avif():
+    """Pillow 是否自带 AVIF 支持（11.3 起）"""
+    return "avif" in features.modules and features.check_module("avif")
+
+
+def _register(kind):
+    with _lock:
+        if kind in _available:
+            return _available[kind]
+        try:
+            if kind == "avif" and pillow_has_avif():
+                available = True
+            else:
+                import pillow_heif
+
+                if kind == "heif":
+                    pillow_heif.register_heif_opener()
+                else:
+                    pillow_heif.register_avif_opener()
+                available = True
+        except ImportError:
+            print("pillow_heif 未安装，HEIC/AVIF 格式支持不可用", file=sys.stderr)
+            available = False
+        except Exception as e:
+            print(f"初始化 {kind.upper()} 支持时出错: {e}", file=sys.stderr)
+            available = False
+        _available[kind] = available
+        return available
+
+
+def register_heif():
+    """注册 HEIF/HEIC 支持（只执行一次），返回是否可用"""
+    return _register("heif")
+
+
+def register_avif():
+    """注册 AVIF 支持（只执行一次），返回是否可用"""
+    return _register("avif")
+
+
+def register_all():
+    register_heif()
+    register_avif()
+
+
+def ensure_plugin(path):
+    """按文件扩展名注册需要的插件（path 也可以是文件对象，此时不做处理）"""
+    if not isinstance(path, (str, os.PathLike)):
+        return
+    ext = os.path.splitext(os.fspath(path))[1].lower()
+    if ext in HEIF_EXTENSIONS:
+        register_heif()
+    elif ext in AVIF_EXTENSIONS:
+        register_avif()
+
+
+def open_image(path):
+    """Image.open 的包装：先按扩展名注册插件；扩展名与内容不符导致无法识别时，
+    注册全部插件后再试一次
+    """
+    ensure_plugin(path)
+    try:
+        return Image.open(path)
+    except UnidentifiedImageError:
+        if len(_available) == 2:
+            raise
+        register_all()
+        if hasattr(path, "seek"):
+            path.seek(0)
+        return Image.open(path)
@@ -0,0 +1,169 @@
+"""分阶段计时：记录每张图片在解码、方向修正、缩放、编码、写入等阶段的耗时
+
+关闭时使用 NULL_TIMER，每个阶段只多一次空的 with 语句，几乎没有开销。
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+STAGES = ("decode", "resize", "convert", "transpose", "encode", "write", "checksum")
+PERCENTILES = (50, 90, 99)
+PROFILE_FIELDS = ("wall", "cpu", "bytes", "pixels")
+
+
+class Stage:
+    """一个阶段的计时区间，可在 with 语句内设置 bytes 和 pixels"""
+
+    __slots__ = ("record", "bytes", "pixels", "wall_start", "cpu_start")
+
+    def __init__(self, record):
+        self.record = record
+        self.bytes = 0
+        self.pixels = 0
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        # 同一阶段多次进入（如目标大小模式的多次编码）时累加
+        self.record["wall"] += time.perf_counter() - self.wall_start
+        self.record["cpu"] += time.process_time() - self.cpu_start
+        self.record["bytes"] += self.bytes
+        self.record["pixels"] += self.pixels
+        return False
+
+
+class StageTimer:
+    """记录单张图片各阶段的墙钟时间、CPU 时间、字节数和像素数
+
+    CPU 时间按进程统计，包含目标大小模式下并行编码线程的时间。
+    """
+
+    def __init__(self, records=None):
+        self.records = {} if records is None else records
+
+    def stage(self, name):
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = dict.fromkeys(PROFILE_FIELDS, 0)
+        return Stage(record)
+
+
+class NullStage:
+    """关闭计时时使用的空阶段，忽略所有赋值"""
+
+    __slots__ = ("bytes", "pixels")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTimer:
+    """关闭计时时使用的空计时器"""
+
+    records = {}
+
+    def stage(self, name):
+        return NULL_STAGE
+
+
+NULL_STAGE = NullStage()
+NULL_TIMER = NullTimer()
+
+
+def peak_rss():
+    """当前进程的峰值常驻内存（字节），无法获取时返回 0"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算百分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, -(-pct * len(sorted_values) // 100) - 1))
+    return sorted_values[int(index)]
+
+
+class BatchProfile:
+    """汇总整个批处理的分阶段耗时，可导出为 JSON 或 CSV"""
+
+    def __init__(self):
+        self.files = []
+        # (格式, 阶段) -> 各字段的取值列表，格式为 "all" 时是全部文件的汇总
+        self.samples = defaultdict(lambda: defaultdict(list))
+
+    def add(self, result):
+        """累计一条带有分阶段记录的结果，没有记录的结果（跳过、去重等）忽略"""
+        if not result.stages:
+            return
+        output_format = os.path.splitext(result.output_path)[1].lstrip(".").lower()
+        self.files.append(
+            {
+                "path": result.image_path,
+                "format": output_format,
+                "input_bytes": result.input_bytes,
+                "output_bytes": result.output_bytes,
+                "stages": result.stages,
+            }
+        )
+        for stage, record in result.stages.items():
+            for key in ("all", output_format):
+                samples = self.samples[key, stage]
+                for name in PROFILE_FIELDS:
+                    samples[name].append(record[name])
+
+    def summary(self):
+        """每个 (格式, 阶段) 一行：次数、墙钟时间百分位数、CPU 合计、字节和像素合计"""
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        rows = []
+        for (output_format, stage), samples in sorted(
+            self.samples.items(),
+            key=lambda item: (
+                item[0][0] != "all",
+                item[0][0],
+                order.get(item[0][1], len(order)),
+            ),
+        ):
+            wall = sorted(samples["wall"])
+            row = {"format": output_format, "stage": stage, "count": len(wall)}
+            for pct in PERCENTILES:
+                row[f"wall_p{pct}_ms"] = round(percentile(wall, pct) * 1000, 3)
+            row["wall_max_ms"] = round(wall[-1] * 1000, 3)
+            row["wall_total_s"] = round(sum(wall), 4)
+            row["cpu_total_s"] = round(sum(samples["cpu"]), 4)
+            row["bytes"] = sum(samples["bytes"])
+            row["pixels"] = sum(samples["pixels"])
+            rows.append(row)
+        return rows
+
+    def to_dict(self):
+        return {"summary": self.summary(), "files": self.files}
+
+    def save(self, path):
+        """按扩展名导出：.csv 写汇总表，其他写包含逐文件记录的 JSON"""
+        if path.lower().endswith(".csv"):
+            rows = self.summary()
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(
+                    f, fieldnames=list(rows[0]) if rows else ["format", "stage"]
+                )
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,111 @@
+"""流式扫描文件夹中的图片（os.scandir，按扩展名和文件头过滤）
+
+扫描边遍历边产出结果，不会先把整个目录树读入内存，适合网络共享上的大目录。
+"""
+
+import os
+import time
+
+from .core import SUPPORTED_EXTENSIONS
+
+SCAN_BATCH_SIZE = 256
+# 即使批次未满，距上次产出超过这个时间（秒）也立即产出，保证界面尽快出现第一批图片
+SCAN_BATCH_INTERVAL = 0.1
+SIGNATURE_BYTES = 32
+# HEIF/AVIF 文件 ftyp 盒中的主品牌
+HEIF_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1")
+AVIF_BRANDS = (b"avif", b"avis")
+
+
+def has_image_signature(header):
+    """根据文件头判断是否为支持的图片格式"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return True
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return True
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return True
+    if header[4:8] == b"ftyp":
+        return header[8:12] in HEIF_BRANDS + AVIF_BRANDS
+    return False
+
+
+def read_signature(path):
+    """读取文件头，无法读取时返回空字节串"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(SIGNATURE_BYTES)
+    except OSError:
+        return b""
+
+
+def scan_images(root, recursive=True, check_signature=True, cancel_event=None):
+    """遍历 root，逐个产出 (路径, 文件大小)
+
+    先按扩展名过滤，再读取文件头确认格式；设置 cancel_event 后尽快停止。
+    无法访问的子目录会被跳过。
+    """
+    for item in _scan(root, recursive, check_signature, cancel_event):
+        if item is not None:
+            yield item
+
+
+def _scan(root, recursive, check_signature, cancel_event):
+    """scan_images 的实现，每扫描完一个目录额外产出一个 None"""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            subdirectories = []
+            for entry in entries:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subdirectories.append(entry.path)
+                        continue
+                    if not entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if check_signature and not has_image_signature(
+                        read_signature(entry.path)
+                    ):
+                        continue
+                    yield entry.path, entry.stat().st_size
+                except OSError:
+                    continue
+        yield None
+        # 倒序入栈，使子目录按目录中的顺序被访问
+        pending.extend(reversed(subdirectories))
+
+
+def scan_batches(
+    root,
+    recursive=True,
+    cancel_event=None,
+    batch_size=SCAN_BATCH_SIZE,
+    interval=SCAN_BATCH_INTERVAL,
+):
+    """把 scan_images 的结果按批产出
+
+    批次满，或距上次产出超过 interval 秒（在每个文件和每个目录结束时检查）时产出一批。
+    """
+    batch = []
+    last_flush = float("-inf")  # 第一张图片立即产出
+    for item in _scan(root, recursive, True, cancel_event):
+        if item is not None:
+            batch.append(item)
+        if not batch:
+            continue
+        if len(batch) >= batch_size or time.monotonic() - last_flush >= interval:
+            yield batch
+            batch = []
+            last_flush = time.monotonic()
+    if batch:
+        yield batch
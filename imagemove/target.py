@@ -0,0 +1,84 @@
+"""目标文件大小模式：在内存中并行搜索满足大小上限的最高质量"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_TARGET_QUALITY = 10
+MAX_TARGET_QUALITY = 95
+# 每轮同时尝试的质量数（编码时 Pillow 会释放 GIL，线程可以并行）
+TARGET_SEARCH_THREADS = 3
+# 质量参数会影响文件大小的格式；其他格式（如 PNG）只编码一次
+QUALITY_FORMATS = ("JPEG", "WEBP", "HEIF", "AVIF")
+
+
+def encode(img, pil_format, options):
+    """把图片编码到内存，返回字节数据"""
+    buffer = io.BytesIO()
+    img.save(buffer, **{"format": pil_format, **options})
+    return buffer.getvalue()
+
+
+def pick_candidates(low, high, count):
+    """在 [low, high] 中均匀选出最多 count 个待测质量"""
+    if high - low + 1 <= count:
+        return list(range(low, high + 1))
+    step = (high - low + 1) / (count + 1)
+    return sorted({low + int(step * (i + 1)) for i in range(count)})
+
+
+def encode_to_target(
+    img,
+    pil_format,
+    max_bytes,
+    options_for,
+    low=MIN_TARGET_QUALITY,
+    high=MAX_TARGET_QUALITY,
+    threads=TARGET_SEARCH_THREADS,
+):
+    """多路二分搜索满足 max_bytes 的最高质量，返回 (数据, 质量, 尝试次数)
+
+    options_for(quality) 返回对应质量的编码参数。即使最低质量也超过上限，
+    仍返回最低质量的结果，由调用方检查大小。质量不影响大小的格式只编码一次，
+    返回的质量为 None。
+    """
+    if pil_format not in QUALITY_FORMATS:
+        return encode(img, pil_format, options_for(high)), None, 1
+
+    # 并发 save 会争用同一个图片对象的 encoderinfo，多线程时每个线程使用自己的副本
+    local = threading.local()
+
+    def encode_quality(quality):
+        if threads == 1:
+            return encode(img, pil_format, options_for(quality))
+        if not hasattr(local, "img"):
+            local.img = img.copy()
+        return encode(local.img, pil_format, options_for(quality))
+
+    floor = low
+    best = None
+    smallest = None
+    attempts = 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while low <= high:
+            candidates = pick_candidates(low, high, threads)
+            encoded = executor.map(encode_quality, candidates)
+            fits, fails = [], []
+            for quality, data in zip(candidates, encoded):
+                attempts += 1
+                if quality == floor:
+                    smallest = (data, quality)
+                if len(data) <= max_bytes:
+                    fits.append(quality)
+                    if best is None or quality > best[1]:
+                        best = (data, quality)
+                else:
+                    fails.append(quality)
+            # 质量越高文件越大：最高的可行值之上、最低的超限值之下继续搜索
+            if fits:
+                low = max(fits) + 1
+            higher_fails = [q for q in fails if q >= low]
+            if higher_fails:
+                high = min(higher_fails) - 1
+    data, quality = best or smallest
+    return data, quality, attempts
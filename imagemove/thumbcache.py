@@ -0,0 +1,241 @@
+"""缩略图缓存：按字节预算淘汰的内存缓存，以及持久化的磁盘缓存"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from .memory import bytes_per_pixel
+from .thumbnails import THUMBNAIL_SIZE, make_thumbnail
+
+DEFAULT_CACHE_LIMIT = 256 * 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+CACHE_FORMAT = "WEBP"
+CACHE_QUALITY = 80
+CACHE_SUFFIX = ".webp"
+
+
+def user_cache_dir(app_name="imagemove"):
+    """返回当前平台的用户缓存目录"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, app_name)
+
+
+def image_nbytes(img):
+    """估算 PIL 图片像素数据占用的字节数（RGB 在 Pillow 中按每像素 4 字节存储）"""
+    return img.width * img.height * bytes_per_pixel(img.mode)
+
+
+class ThumbnailMemoryCache:
+    """保存缩略图原始像素（PIL Image）的 LRU 缓存，总字节数不超过预算
+
+    PhotoImage 不放在这里，由界面线程在需要显示时再创建。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_LIMIT):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """读取缓存并标记为最近使用，未命中返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, img):
+        """写入缓存，超过预算时淘汰最久未使用的条目"""
+        nbytes = image_nbytes(img)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (img, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+                self.evictions += 1
+
+    def pop(self, key):
+        """移除一个条目"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """命中/未命中/淘汰计数及当前占用，用于调整预算"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ThumbnailDiskCache:
+    """把编码后的缩略图保存在磁盘上，命中时无需打开原图
+
+    缓存条目的修改时间即最近访问时间；总大小超过上限时，
+    按最近访问时间从旧到新删除，直到降到上限的 80%。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_LIMIT):
+        self.cache_dir = cache_dir or os.path.join(user_cache_dir(), "thumbnails")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, image_path, size):
+        stat = os.stat(image_path)
+        raw = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_SUFFIX)
+
+    def get(self, image_path, size=THUMBNAIL_SIZE):
+        """读取缓存的缩略图，未命中返回 None"""
+        try:
+            entry = self._entry_path(self._key(image_path, size))
+            with Image.open(entry) as img:
+                img.load()
+            os.utime(entry)  # 标记为最近使用
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return img
+
+    def put(self, image_path, img, size=THUMBNAIL_SIZE):
+        """写入缩略图（先写临时文件再替换，避免留下半个文件）"""
+        try:
+            entry = self._entry_path(self._key(image_path, size))
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    img.save(f, format=CACHE_FORMAT, quality=CACHE_QUALITY)
+                os.replace(tmp_path, entry)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._account(os.path.getsize(entry))
+        except (OSError, ValueError) as e:
+            print(f"写入缩略图缓存失败: {e}")
+
+    def load(self, image_path, size=THUMBNAIL_SIZE):
+        """优先从缓存读取，未命中时生成并写入缓存"""
+        img = self.get(image_path, size)
+        if img is None:
+            img = self.create(image_path, size)
+        return img
+
+    def create(self, image_path, size=THUMBNAIL_SIZE):
+        """解码原图生成缩略图并写入缓存（不先查找缓存）"""
+        img = make_thumbnail(image_path, size)
+        self.put(image_path, img, size)
+        return img
+
+    def _entries(self):
+        for dir_path, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith(CACHE_SUFFIX):
+                    path = os.path.join(dir_path, file_name)
+                    try:
+                        yield path, os.stat(path)
+                    except OSError:
+                        continue
+
+    def _account(self, added):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(st.st_size for _, st in self._entries())
+            else:
+                self._total_bytes += added
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.8))
+
+    def _evict(self, target):
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        for path, st in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= st.st_size
+                self.evictions += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+
+    def stats(self):
+        """命中/未命中/淘汰计数及磁盘占用（尚未统计时扫描一次缓存目录）"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(st.st_size for _, st in self._entries())
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """删除所有缓存条目"""
+        with self._lock:
+            for path, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+            self._total_bytes = 0
@@ -0,0 +1,216 @@
+"""缩略图加载：固定大小的线程池 + 优先级队列，可批量取消"""
+
+import io
+import itertools
+import os
+import queue
+import threading
+
+from PIL import ExifTags, Image
+
+from .core import apply_orientation, get_orientation
+from .plugins import open_image
+
+THUMBNAIL_SIZE = 120
+THUMBNAIL_WORKERS = min(4, os.cpu_count() or 1)
+PRIORITY_VISIBLE = 0
+PRIORITY_BACKGROUND = 1
+
+
+def _same_aspect(size_a, size_b, tolerance=0.02):
+    ratio_a = size_a[0] / size_a[1]
+    ratio_b = size_b[0] / size_b[1]
+    return abs(ratio_a - ratio_b) <= ratio_a * tolerance
+
+
+def exif_thumbnail(img, size):
+    """读取 EXIF IFD1 中内嵌的 JPEG 缩略图，不可用时返回 None"""
+    raw = img.info.get("exif")
+    if not raw:
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(0x0201)  # JPEGInterchangeFormat
+        length = ifd1.get(0x0202)  # JPEGInterchangeFormatLength
+        if not offset or not length:
+            return None
+        tiff = raw[6:] if raw.startswith(b"Exif\x00\x00") else raw
+        thumb = Image.open(io.BytesIO(tiff[offset : offset + length]))
+        thumb.load()
+    except Exception:
+        return None
+    # 太小或带黑边（宽高比不一致）的内嵌缩略图不使用
+    if max(thumb.size) < size or not _same_aspect(thumb.size, img.size):
+        return None
+    return thumb
+
+
+def heif_thumbnail(img, size):
+    """读取 HEIF/AVIF 内嵌的缩略图，不可用时返回 None"""
+    if img.format not in ("HEIF", "AVIF"):
+        return None
+    try:
+        # Pillow 自带的 AVIF 插件也能打开 AVIF，此时 pillow_heif 可能没有安装
+        import pillow_heif
+    except ImportError:
+        return None
+    helper = getattr(pillow_heif, "thumbnail", None)
+    if helper is None:
+        # 新版 pillow_heif 通过 draft() 选择内嵌缩略图
+        return None
+    try:
+        thumb = helper(img, min_box=size)
+        if thumb is img or not hasattr(thumb, "size") or max(thumb.size) < size:
+            return None
+        if not isinstance(thumb, Image.Image):
+            thumb = thumb.to_pillow()
+    except Exception:
+        return None
+    return thumb
+
+
+def draft_box(image_size, size, reducing_gap=2.0):
+    """draft() 使用的目标尺寸：保持宽高比，并留出 reducing_gap 倍的余量"""
+    width, height = image_size
+    scale = size * reducing_gap / max(width, height)
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """生成缩略图（PIL Image），不涉及 Tk
+
+    依次尝试 EXIF 内嵌缩略图、HEIF 内嵌缩略图、draft() 低分辨率解码
+    （JPEG DCT 缩放；新版 pillow_heif 也在这里选择内嵌缩略图），
+    都不可用时才完整解码。方向在缩小之后才修正。
+    """
+    with open_image(image_path) as img:
+        orientation = get_orientation(img)
+        thumb = exif_thumbnail(img, size) or heif_thumbnail(img, size)
+        if thumb is None:
+            thumb = img
+            thumb.draft(None, draft_box(img.size, size))
+        thumb.thumbnail((size, size))
+        return apply_orientation(thumb, orientation)
+
+
+class _Request:
+    """队列中的一个缩略图请求"""
+
+    __slots__ = ("key", "callback", "generation", "cancelled")
+
+    def __init__(self, key, callback, generation):
+        self.key = key
+        self.callback = callback
+        self.generation = generation
+        self.cancelled = False
+
+
+class ThumbnailLoader:
+    """用固定数量的工作线程加载缩略图
+
+    可见的条目优先加载；cancel_all() 会作废所有排队中的请求，
+    已在解码中的请求完成后也不会再回调。
+
+    lookup_func 为缓存查找（如 ThumbnailDiskCache.get），命中时直接返回；
+    未命中时才调用 load_func 解码，同时解码的数量不超过 max_inflight。
+    """
+
+    def __init__(
+        self,
+        load_func=make_thumbnail,
+        workers=THUMBNAIL_WORKERS,
+        max_inflight=None,
+        lookup_func=None,
+    ):
+        self.load_func = load_func
+        self.lookup_func = lookup_func
+        self.workers = max(1, workers)
+        self._queue = queue.PriorityQueue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._generation = 0
+        # 限制同时解码的图片数量，避免大图同时占满内存；默认只允许一半的
+        # 工作线程同时解码，其余线程可以继续处理缓存命中的请求
+        if max_inflight is None:
+            max_inflight = max(1, self.workers // 2)
+        self._inflight = threading.BoundedSemaphore(max(1, max_inflight))
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, callback, priority=PRIORITY_BACKGROUND):
+        """提交加载请求，callback(key, image, error) 在工作线程中调用"""
+        with self._lock:
+            self._ensure_started()
+            old = self._pending.get(key)
+            if old is not None:
+                old.cancelled = True
+            request = _Request(key, callback, self._generation)
+            self._pending[key] = request
+        self._queue.put((priority, next(self._seq), request))
+
+    def prioritize(self, keys):
+        """把仍在排队的请求提到最前面（例如当前可见的条目）"""
+        with self._lock:
+            requests = []
+            for key in keys:
+                old = self._pending.get(key)
+                if old is None or old.cancelled:
+                    continue
+                old.cancelled = True
+                request = _Request(key, old.callback, old.generation)
+                self._pending[key] = request
+                requests.append(request)
+        for request in requests:
+            self._queue.put((PRIORITY_VISIBLE, next(self._seq), request))
+
+    def cancel(self, key):
+        """取消某个尚未开始的请求"""
+        with self._lock:
+            request = self._pending.pop(key, None)
+            if request is not None:
+                request.cancelled = True
+
+    def cancel_all(self):
+        """作废所有未完成的请求（重建网格时调用）"""
+        with self._lock:
+            self._generation += 1
+            for request in self._pending.values():
+                request.cancelled = True
+            self._pending.clear()
+
+    def _is_current(self, request):
+        return not request.cancelled and request.generation == self._generation
+
+    def _worker(self):
+        while True:
+            _, _, request = self._queue.get()
+            try:
+                if not self._is_current(request):
+                    continue
+                image = error = None
+                try:
+                    if self.lookup_func is not None:
+                        image = self.lookup_func(request.key)
+                    if image is None:
+                        with self._inflight:
+                            if not self._is_current(request):
+                                continue
+                            image = self.load_func(request.key)
+                except Exception as e:
+                    error = e
+                with self._lock:
+                    if self._pending.get(request.key) is request:
+                        del self._pending[request.key]
+                    current = request.generation == self._generation
+                if current:
+                    request.callback(request.key, image, error)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,145 @@
+"""变换规划：把方向修正、缩放和色彩模式转换合并成最少的操作序列
+
+规划只依据文件头信息（尺寸、模式、EXIF 方向），不依赖 Tk 和像素数据，
+可以单独测试，也被内存估算复用。原则：
+  - 方向为 1 时不做 transpose；
+  - 先缩小再旋转，旋转只作用在小图上；
+  - 模式转换放在最小的中间图上（缩小之后、放大之前）。
+"""
+
+from dataclasses import dataclass, field
+
+from PIL import Image
+
+# 先用 draft/reduce 缩小到目标尺寸的这个倍数，再用 LANCZOS 收尾
+RESIZE_REDUCING_GAP = 2.0
+
+# EXIF Orientation 对应的变换（与 ImageOps.exif_transpose 一致）
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# 这些方向修正后宽高互换
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+# 各输出格式可以直接编码的模式，其他模式需要先转换
+ENCODABLE_MODES = {
+    "JPEG": ("L", "RGB", "CMYK"),
+    "WEBP": ("RGB", "RGBA"),
+    "HEIF": ("RGB", "RGBA"),
+    "AVIF": ("RGB", "RGBA"),
+}
+# 可以直接高质量缩放的模式（"1"、"P" 等会被 Pillow 退化为最近邻缩放）
+RESAMPLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "I", "F")
+
+
+@dataclass(frozen=True)
+class TransformStep:
+    """一步操作：resize（参数为尺寸）、convert（模式）或 transpose（Image.Transpose）"""
+
+    op: str
+    arg: object
+
+
+@dataclass
+class TransformPlan:
+    """一张图片从解码到编码之间的操作序列"""
+
+    steps: list = field(default_factory=list)
+    draft_size: tuple = None  # 解码前传给 draft() 的尺寸，None 表示完整解码
+    output_size: tuple = None
+    output_mode: str = None
+
+    @property
+    def transposes(self):
+        return any(step.op == "transpose" for step in self.steps)
+
+
+def output_mode(mode, pil_format, has_alpha=False):
+    """编码为 pil_format 时需要的模式（不需要转换时返回原模式）"""
+    allowed = ENCODABLE_MODES.get(pil_format)
+    if allowed is None or mode in allowed:
+        return mode
+    if pil_format == "JPEG":
+        return "L" if mode in ("1", "LA") else "RGB"
+    return "RGBA" if has_alpha else "RGB"
+
+
+def working_mode(mode, has_alpha=False):
+    """多个输出共用的中间图模式：可以高质量缩放的模式保持不变，其他模式转换为 L/RGB/RGBA"""
+    if mode in RESAMPLE_MODES:
+        return mode
+    if mode == "1":
+        return "L"
+    return "RGBA" if has_alpha else "RGB"
+
+
+def plan_transform(
+    size,
+    mode,
+    orientation=1,
+    pil_format=None,
+    target_size=None,
+    has_alpha=None,
+    reducing_gap=RESIZE_REDUCING_GAP,
+):
+    """生成操作序列
+
+    size/mode 为解码前文件头中的尺寸和模式，target_size 为修正方向后的目标尺寸
+    （None 表示不缩放），pil_format 为输出格式（None 表示不转换模式）。
+    has_alpha 默认按模式判断，调色板图片需要根据 transparency 信息传入。
+    """
+    if has_alpha is None:
+        has_alpha = mode in ("RGBA", "LA", "PA", "RGBa", "La")
+    rotated = orientation in ROTATED_ORIENTATIONS
+    plan = TransformPlan(output_size=size, output_mode=mode)
+    target_mode = output_mode(mode, pil_format, has_alpha) if pil_format else mode
+
+    resize_to = None
+    if target_size is not None:
+        # 在原始方向上缩放，目标尺寸按方向换回
+        resize_to = tuple(target_size[::-1]) if rotated else tuple(target_size)
+        if resize_to == tuple(size):
+            resize_to = None
+
+    convert_first = target_mode != mode and (
+        resize_to is None
+        or mode not in RESAMPLE_MODES
+        or resize_to[0] * resize_to[1] > size[0] * size[1]
+    )
+    if convert_first:
+        plan.steps.append(TransformStep("convert", target_mode))
+    if resize_to is not None:
+        if resize_to[0] < size[0] and resize_to[1] < size[1]:
+            plan.draft_size = (
+                int(resize_to[0] * reducing_gap),
+                int(resize_to[1] * reducing_gap),
+            )
+        plan.steps.append(TransformStep("resize", resize_to))
+        plan.output_size = resize_to
+    if target_mode != mode and not convert_first:
+        plan.steps.append(TransformStep("convert", target_mode))
+    plan.output_mode = target_mode
+
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    if method is not None:
+        plan.steps.append(TransformStep("transpose", method))
+        if rotated:
+            plan.output_size = plan.output_size[::-1]
+    return plan
+
+
+def apply_step(img, step, reducing_gap=RESIZE_REDUCING_GAP):
+    """执行一步操作，返回新图片"""
+    if step.op == "resize":
+        return img.resize(step.arg, Image.LANCZOS, reducing_gap=reducing_gap)
+    if step.op == "convert":
+        return img if img.mode == step.arg else img.convert(step.arg)
+    if step.op == "transpose":
+        return img.transpose(step.arg)
+    raise ValueError(f"未知的操作: {step.op}")
@@ -0,0 +1,431 @@
+"""热文件夹：持续监视输入目录，新文件写完后自动转换
+
+Linux 上用 inotify 接收文件变化，其他系统定时列目录比较大小和修改时间。
+文件在 settle 秒内大小和修改时间都不再变化才认为已写完（上传中的文件不会被处理）。
+写完的文件进入有界队列，队列满时暂停从目录中接收新文件（背压），
+由进程池按当前的格式、质量和输出设置转换，并统计从出现到写出的延迟。
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from .core import (
+    SUPPORTED_EXTENSIONS,
+    TEMP_SUFFIX,
+    OutputVariant,
+    convert_image,
+    existing_names,
+    expand_result,
+    failed_result,
+    plan_variant_jobs,
+)
+from .profiling import percentile
+
+# 主循环每次等待文件事件的时间（秒），也是发现任务完成的最大延迟
+WATCH_TICK = 0.1
+# 大小和修改时间保持不变多久认为文件已写完（秒）
+DEFAULT_SETTLE = 1.0
+# 没有 inotify 时列目录的间隔（秒）
+POLL_INTERVAL = 1.0
+# 每个工作进程对应的队列长度
+QUEUE_PER_WORKER = 4
+# 计算延迟分位数时保留的最近样本数
+LATENCY_WINDOW = 10000
+# 记住最近处理过的文件数（避免重新列目录时重复处理）
+PROCESSED_LIMIT = 100000
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_watched_file(name):
+    """是否为需要处理的图片（跳过隐藏文件和原子写入的临时文件）"""
+    return (
+        not name.startswith(".")
+        and not name.endswith(TEMP_SUFFIX)
+        and name.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+
+def list_folder(folder):
+    """列出目录中的图片文件"""
+    try:
+        with os.scandir(folder) as entries:
+            return [
+                entry.path
+                for entry in entries
+                if is_watched_file(entry.name) and entry.is_file()
+            ]
+    except OSError:
+        return []
+
+
+class InotifyWatcher:
+    """Linux inotify：目录中有文件创建、写入或移入时返回其路径"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), INOTIFY_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"无法监视 {folder}")
+
+    def poll(self, timeout):
+        """等待最多 timeout 秒，返回有变化的文件路径；事件队列溢出时重新列目录"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        paths = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return list_folder(self.folder)
+                name = os.fsdecode(name)
+                if name and is_watched_file(name):
+                    paths.append(os.path.join(self.folder, name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """没有 inotify 时的退路：每 interval 秒列一次目录，返回新出现或有变化的文件"""
+
+    def __init__(self, folder, interval=POLL_INTERVAL):
+        self.folder = folder
+        self.interval = interval
+        self.snapshot = {}
+        self.next_scan = 0.0
+
+    def poll(self, timeout):
+        now = time.monotonic()
+        if now < self.next_scan:
+            time.sleep(min(timeout, self.next_scan - now))
+            return []
+        self.next_scan = now + self.interval
+        changed = []
+        snapshot = {}
+        for path in list_folder(self.folder):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            snapshot[path] = signature
+            if self.snapshot.get(path) != signature:
+                changed.append(path)
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def ignore_interrupt():
+    """工作进程忽略 Ctrl+C，由主进程停止派发后等待正在转换的图片完成"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def create_watcher(folder, polling=False):
+    """Linux 上优先使用 inotify，不可用时（或 polling 为 True）定时列目录"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用，改为定时扫描: {e}", file=sys.stderr)
+    return PollingWatcher(folder)
+
+
+@dataclass
+class PendingFile:
+    """等待写完的文件"""
+
+    arrived: float  # 第一次发现的时间（time.monotonic）
+    signature: tuple = None  # (大小, 修改时间)
+    stable_since: float = 0.0
+
+
+class SettleTracker:
+    """去抖：文件大小和修改时间在 settle 秒内不变（且不为空）才算写完"""
+
+    def __init__(self, settle=DEFAULT_SETTLE):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, path, now):
+        entry = self.pending.get(path)
+        if entry is None:
+            self.pending[path] = PendingFile(now, stable_since=now)
+        else:
+            entry.stable_since = now
+
+    def pop_ready(self, now, limit):
+        """取出最多 limit 个已写完的文件，返回 [(路径, PendingFile)]"""
+        ready = []
+        for path, entry in list(self.pending.items()):
+            if len(ready) >= limit:
+                break
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 文件被删除或移走
+                del self.pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != entry.signature or not stat.st_size:
+                entry.signature = signature
+                entry.stable_since = now
+            elif now - entry.stable_since >= self.settle:
+                del self.pending[path]
+                ready.append((path, entry))
+        return ready
+
+
+@dataclass
+class WatchStats:
+    """监视模式的统计：从文件出现到输出写完的延迟、去抖和排队时间、队列深度和背压次数"""
+
+    files: int = 0
+    errors: int = 0
+    max_queue: int = 0
+    backpressure: int = 0  # 队列已满、暂停接收新文件的次数
+    started: float = field(default_factory=time.monotonic)
+    latency: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    settle: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    queue_wait: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def to_dict(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        summary = {
+            "files": self.files,
+            "errors": self.errors,
+            "files_per_s": round(self.files / elapsed, 3),
+            "max_queue": self.max_queue,
+            "backpressure": self.backpressure,
+        }
+        for name in ("latency", "settle", "queue_wait"):
+            samples = sorted(getattr(self, name))
+            for p in (50, 90, 99):
+                summary[f"{name}_p{p}_s"] = round(percentile(samples, p), 3)
+            summary[f"{name}_max_s"] = round(samples[-1], 3) if samples else 0.0
+        return summary
+
+
+@dataclass
+class QueuedJob:
+    """排队等待派发的任务"""
+
+    job: object
+    estimate: int
+    arrived: float
+    ready: float
+
+
+class HotFolder:
+    """持续监视 folder，把写完的新图片转换到 output_folder
+
+    engine 为 BatchEngine，用于估算内存、判断直接复制和获取进程数与内存预算；
+    variants 为 OutputVariant 列表，不传时只输出 output_format/quality 一种；
+    其余参数与 plan_variant_jobs 相同。on_result(result, latency) 在运行 run() 的线程中调用。
+    队列长度为 max_queue，队列满时文件留在去抖阶段，直到有空位才接收（背压）。
+
+    输出目录只在开始时列一次，之后由规划和转换结果更新文件名集合；
+    监视期间在输出目录中手动增删的文件不会被看到。
+    """
+
+    def __init__(
+        self,
+        folder,
+        output_folder,
+        output_format,
+        quality,
+        engine,
+        policy="skip",
+        max_bytes=0,
+        manifest=None,
+        profile=False,
+        encoder_profile=None,
+        settle=DEFAULT_SETTLE,
+        max_queue=0,
+        polling=False,
+        on_result=None,
+        variants=None,
+    ):
+        if os.path.abspath(folder) == os.path.abspath(output_folder):
+            raise ValueError("监视目录和输出目录不能相同")
+        self.folder = folder
+        self.output_folder = output_folder
+        self.plan_options = dict(
+            output_folder=output_folder,
+            variants=variants or [OutputVariant(output_format, int(quality))],
+            policy=policy,
+            max_bytes=max_bytes,
+            manifest=manifest,
+            profile=profile,
+        )
+        if encoder_profile:
+            self.plan_options["encoder_profile"] = encoder_profile
+        self.engine = engine
+        self.max_queue = max_queue or engine.max_workers * QUEUE_PER_WORKER
+        self.tracker = SettleTracker(settle)
+        self.polling = polling
+        self.on_result = on_result
+        self.queue = deque()
+        self.processed = {}  # 路径 -> 转换时的 (大小, 修改时间)
+        self.output_names = None  # 输出目录中已有或已分配的文件名（casefold）
+        self.claimed = set()  # 已分配但尚未写出的新文件名，失败时释放
+        self.stats = WatchStats()
+        self.stop_event = threading.Event()
+        # 同时运行多张图片，编码线程数按进程数平分
+        self.encoder_threads = max(1, (os.cpu_count() or 1) // engine.max_workers)
+
+    def stop(self):
+        """让 run() 在当前任务完成后返回（可在其他线程中调用）"""
+        self.stop_event.set()
+
+    def run(self):
+        """监视直到 stop() 被调用；目录中已有的图片也会被处理"""
+        watcher = create_watcher(self.folder, self.polling)
+        running = {}  # future -> QueuedJob
+        now = time.monotonic()
+        for path in list_folder(self.folder):
+            self.tracker.touch(path, now)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.engine.max_workers, initializer=ignore_interrupt
+            ) as executor:
+                while not self.stop_event.is_set():
+                    for path in watcher.poll(WATCH_TICK):
+                        self.tracker.touch(path, time.monotonic())
+                    self.accept()
+                    self.admit(executor, running)
+                    for future in [f for f in running if f.done()]:
+                        self.finish(future, running.pop(future))
+                for future in running:
+                    future.cancel()
+                for future, queued in running.items():
+                    if not future.cancelled():
+                        self.finish(future, queued)
+        finally:
+            watcher.close()
+        return self.stats
+
+    def accept(self):
+        """把写完的文件规划成任务放入队列；队列满时不接收（背压）"""
+        space = self.max_queue - len(self.queue)
+        if space <= 0:
+            if self.tracker.pending:
+                self.stats.backpressure += 1
+            return
+        now = time.monotonic()
+        ready = []
+        for path, entry in self.tracker.pop_ready(now, space):
+            if self.processed.get(path) == entry.signature:
+                continue
+            self.processed.pop(path, None)
+            self.processed[path] = entry.signature
+            if len(self.processed) > PROCESSED_LIMIT:
+                del self.processed[next(iter(self.processed))]
+            self.stats.settle.append(now - entry.arrived)
+            ready.append((path, entry))
+        if not ready:
+            return
+
+        arrived = {path: entry.arrived for path, entry in ready}
+        if self.output_names is None:
+            self.output_names = existing_names(self.output_folder)
+        jobs, skipped = plan_variant_jobs(
+            [path for path, _ in ready],
+            existing=self.output_names,
+            **self.plan_options,
+        )
+        for job in jobs:
+            for item in [job, *job.variants]:
+                name = os.path.basename(item.output_path).casefold()
+                if name not in self.output_names:
+                    self.output_names.add(name)
+                    self.claimed.add(name)
+        for result in skipped:
+            self.report(result, arrived[result.image_path])
+        jobs = [replace(job, encoder_threads=self.encoder_threads) for job in jobs]
+        for job, estimate in self.engine.plan_memory(jobs):
+            if job.passthrough:
+                # 直接复制不需要解码，在当前进程中完成
+                self.finish_job(job, convert_image(job), arrived[job.image_path])
+                continue
+            self.queue.append(QueuedJob(job, estimate, arrived[job.image_path], now))
+        self.stats.max_queue = max(self.stats.max_queue, len(self.queue))
+
+    def admit(self, executor, running):
+        """在进程数和内存预算允许时派发队首的任务（保持到达顺序）"""
+        used = sum(queued.estimate for queued in running.values())
+        while self.queue and len(running) < self.engine.max_workers:
+            queued = self.queue[0]
+            if running and used + queued.estimate > self.engine.memory_budget:
+                break
+            self.queue.popleft()
+            self.stats.queue_wait.append(time.monotonic() - queued.ready)
+            running[executor.submit(convert_image, queued.job)] = queued
+            used += queued.estimate
+
+    def finish(self, future, queued):
+        try:
+            result = future.result()
+        except Exception as e:
+            # 工作进程异常退出（如被信号中断）
+            result = failed_result(queued.job, str(e))
+        self.finish_job(queued.job, result, queued.arrived)
+
+    def finish_job(self, job, result, arrived):
+        """报告任务及其同一源文件其他输出的结果"""
+        for item_job, item in zip([job, *job.variants], expand_result(result)):
+            self.report(item, arrived, item_job)
+
+    def report(self, result, arrived, job=None):
+        latency = time.monotonic() - arrived
+        if job is not None:
+            name = os.path.basename(job.output_path).casefold()
+            if name in self.claimed:
+                self.claimed.discard(name)
+                if result.status != "ok":
+                    # 没有写出文件，文件名可以再分配
+                    self.output_names.discard(name)
+        if result.status == "ok":
+            self.stats.files += 1
+            self.stats.latency.append(latency)
+        elif result.status == "error":
+            self.stats.errors += 1
+        manifest = self.plan_options["manifest"]
+        if manifest is not None and result.status == "ok" and job is not None:
+            manifest.record(job, result)
+        if self.on_result is not None:
+            self.on_result(result, latency)
@@ -1,30 +1,269 @@
+import time
+
+START_TIME = time.perf_counter()  # 启动计时的起点（--startup-time）
+
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
-from ttkthemes import ThemedTk
-from PIL import Image, ImageTk, ImageOps
-import pillow_heif
 import os
 import subprocess
-import shutil
 import threading
+from concurrent.futures import Future
+import json
 import sys
-from pathlib import Path
-
-# 注册 HEIF 和 AVIF 格式支持
-try:
-    pillow_heif.register_heif_opener()
-    pillow_heif.register_avif_opener()
-except ImportError:
-    print("pillow_heif 未安装，HEIC/AVIF 格式支持不可用")
-except Exception as e:
-    print(f"初始化 HEIC/AVIF 支持时出错: {e}")
+import math
+import multiprocessing
+
+from imagemove.core import (
+    DEFAULT_COMPRESSION,
+    DEFAULT_WORKERS,
+    OUTPUT_FORMATS,
+    SUPPORTED_EXTENSIONS,
+    WECHAT_FORMAT,
+    BatchReport,
+    plan_jobs,
+)
+from imagemove.encoders import (
+    DEFAULT_ENCODER_PROFILE,
+    ENCODER_PROFILE_LABELS,
+    ENCODER_PROFILES,
+)
+from imagemove.engine import BatchEngine
+from imagemove.events import EventChannel, ThroughputMeter, format_duration
+from imagemove.manifest import BatchManifest
+from imagemove.metadata import MetadataIndex
+from imagemove.profiling import BatchProfile, percentile
+from imagemove.scan import scan_batches
+from imagemove.thumbcache import (
+    ThumbnailDiskCache,
+    ThumbnailMemoryCache,
+    user_cache_dir,
+)
+from imagemove.thumbnails import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_VISIBLE,
+    THUMBNAIL_SIZE,
+    ThumbnailLoader,
+)
+from imagemove.watch import HotFolder
 
 # 常量定义
-THUMBNAIL_SIZE = 120
 PADDING = 5
-SCROLLBAR_WIDTH = 20
-DEFAULT_COMPRESSION = 95
+CELL_WIDTH = THUMBNAIL_SIZE + 2 * PADDING
+CELL_HEIGHT = THUMBNAIL_SIZE + 48
+OVERSCAN_ROWS = 2
+EVENT_INTERVAL_MS = 100  # 界面约 10 Hz 刷新一次
+BATCH_REPORT_NAME = "imagemove-report.json"
+BATCH_PROFILE_NAME = "imagemove-profile"
+THEME_NAME = "arc"
+STARTUP_LOG_NAME = "startup-times.jsonl"
+CACHE_LOG_NAME = "thumbnail-cache.jsonl"
+
+
+class ThumbnailCell:
+    """网格中可复用的一个单元格"""
+
+    def __init__(self, canvas, on_click):
+        self.index = None
+        self.image_path = None
+        self.background = False  # 缩略图作为预加载行以低优先级请求
+        self.frame = ttk.Frame(
+            canvas,
+            style="TFrame",
+            padding=3,
+            width=CELL_WIDTH - PADDING,
+            height=CELL_HEIGHT - PADDING,
+        )
+        self.frame.pack_propagate(False)
+        self.thumbnail_label = ttk.Label(self.frame, text="加载中...", anchor="center")
+        self.thumbnail_label.pack()
+        self.text_label = ttk.Label(
+            self.frame,
+            wraplength=THUMBNAIL_SIZE,
+            justify="center",
+            padding=(0, 2, 0, 2),
+            style="TLabel",
+        )
+        self.text_label.pack()
+        self.item = canvas.create_window(
+            0, 0, window=self.frame, anchor="nw", state="hidden"
+        )
+        for widget in (self.frame, self.thumbnail_label, self.text_label):
+            widget.bind("<Button-1>", lambda event: on_click(event, self.image_path))
+
+    def set_selected(self, selected):
+        """切换选中样式"""
+        self.frame.config(style="Selected.TFrame" if selected else "TFrame")
+        label_style = "Selected.TLabel" if selected else "TLabel"
+        self.thumbnail_label.config(style=label_style)
+        self.text_label.config(style=label_style)
+
+    def set_image(self, img_tk):
+        """显示缩略图"""
+        self.thumbnail_label.configure(image=img_tk, text="")
+        self.thumbnail_label.image = img_tk
+
+    def set_text(self, text):
+        """显示占位文字（加载中/加载失败）"""
+        self.thumbnail_label.configure(image="", text=text)
+        self.thumbnail_label.image = None
+
+
+class ThumbnailGrid:
+    """虚拟化的缩略图网格
+
+    只为可见行（加上 OVERSCAN_ROWS 行预加载）创建单元格，
+    滚动时复用这些单元格，窗口大小变化时只重新排列，不重建控件。
+    可见行的缩略图优先加载，预加载行以低优先级排队，滚入可见范围时提前。
+    """
+
+    def __init__(self, parent, processor):
+        self.processor = processor
+        self.canvas = tk.Canvas(parent, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(
+            parent, orient="vertical", command=self.canvas.yview
+        )
+        self.canvas.configure(yscrollcommand=self.on_yscroll)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.cells = []
+        self.columns = 1
+
+        self.canvas.bind("<Configure>", self.on_resize)
+
+        # 绑定鼠标滚轮事件
+        def on_mousewheel(event):
+            self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+
+        self.canvas.bind_all("<MouseWheel>", on_mousewheel)
+
+    def compute_columns(self):
+        """根据画布宽度计算列数"""
+        width = self.canvas.winfo_width()
+        if width <= 1:
+            width = 600
+        return max(1, (width - PADDING) // CELL_WIDTH)
+
+    def update_scrollregion(self):
+        """根据图片数量设置可滚动区域"""
+        rows = math.ceil(len(self.processor.image_paths) / self.columns)
+        self.canvas.configure(
+            scrollregion=(
+                0,
+                0,
+                self.columns * CELL_WIDTH + PADDING,
+                rows * CELL_HEIGHT + PADDING,
+            )
+        )
+
+    def reset(self):
+        """图片列表变化后回到顶部并刷新"""
+        for cell in self.cells:
+            cell.index = None
+            cell.image_path = None
+        self.columns = self.compute_columns()
+        self.update_scrollregion()
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def extend(self):
+        """图片列表末尾追加了图片（扫描中），保持滚动位置刷新"""
+        self.update_scrollregion()
+        self.refresh()
+
+    def on_resize(self, event):
+        """窗口大小变化时重新排列列数"""
+        columns = self.compute_columns()
+        if columns != self.columns:
+            self.columns = columns
+            self.update_scrollregion()
+        self.refresh()
+
+    def on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def visible_range(self, overscan=OVERSCAN_ROWS):
+        """返回需要显示的图片索引范围 [start, end)，包括上下 overscan 行"""
+        total = len(self.processor.image_paths)
+        if not total:
+            return 0, 0
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), CELL_HEIGHT)
+        first_row = max(0, int(top // CELL_HEIGHT) - overscan)
+        last_row = int((top + height) // CELL_HEIGHT) + 1 + overscan
+        return first_row * self.columns, min(total, last_row * self.columns)
+
+    def refresh(self):
+        """把单元格绑定到当前可见的图片上"""
+        paths = self.processor.image_paths
+        start, end = self.visible_range()
+        screen_start, screen_end = self.visible_range(overscan=0)
+
+        # 仍在可见范围内的单元格保持绑定，其余的回收复用
+        free = []
+        promoted = []
+        for cell in self.cells:
+            if cell.index is not None and start <= cell.index < end:
+                if cell.image_path == paths[cell.index]:
+                    if cell.background and screen_start <= cell.index < screen_end:
+                        # 预加载行滚入可见范围，尚未加载时提到队列最前面
+                        cell.background = False
+                        promoted.append(cell.image_path)
+                    continue
+            if cell.image_path is not None:
+                self.processor.release_thumbnail(cell.image_path)
+            cell.index = None
+            cell.image_path = None
+            free.append(cell)
+        if promoted:
+            self.processor.thumbnail_loader.prioritize(promoted)
+
+        bound = {cell.index: cell for cell in self.cells if cell.index is not None}
+        for index in range(start, end):
+            cell = bound.get(index)
+            if cell is None:
+                cell = free.pop() if free else self.create_cell()
+                background = not screen_start <= index < screen_end
+                self.bind_cell(cell, index, paths[index], background)
+            row, col = divmod(index, self.columns)
+            self.canvas.coords(
+                cell.item, col * CELL_WIDTH + PADDING, row * CELL_HEIGHT + PADDING
+            )
+            self.canvas.itemconfigure(cell.item, state="normal")
+
+        for cell in free:
+            self.canvas.itemconfigure(cell.item, state="hidden")
+
+    def create_cell(self):
+        cell = ThumbnailCell(self.canvas, self.processor.on_thumbnail_click)
+        self.cells.append(cell)
+        return cell
+
+    def bind_cell(self, cell, index, image_path, background=False):
+        """让单元格显示指定图片，background 为 True 时以低优先级加载缩略图"""
+        cell.index = index
+        cell.image_path = image_path
+        cell.background = background
+        file_name = os.path.basename(image_path)
+        file_name = file_name[:12] + "..." if len(file_name) > 15 else file_name
+        size_str = self.processor.format_file_size(self.processor.file_size(image_path))
+        cell.text_label.configure(text=f"{file_name} ({size_str})")
+        cell.set_selected(image_path in self.processor.selected_paths)
+        cell.set_text("加载中...")
+        self.processor.load_thumbnail_async(
+            image_path, PRIORITY_BACKGROUND if background else PRIORITY_VISIBLE
+        )
+
+    def cells_for(self, image_path):
+        """当前显示指定图片的单元格"""
+        return [cell for cell in self.cells if cell.image_path == image_path]
+
+    def update_selection(self):
+        """刷新可见单元格的选中样式"""
+        for cell in self.cells:
+            if cell.image_path is not None:
+                cell.set_selected(cell.image_path in self.processor.selected_paths)
 
 
 class ImageProcessor:
@@ -33,22 +272,53 @@ class ImageProcessor:
     def __init__(self):
         self.image_paths = []
         self.output_folder = ""
-        self.thumbnail_cache = {}
-        self.selected_thumbnails = []
+        self.thumbnail_cache = ThumbnailMemoryCache()
+        self.selected_paths = set()
         self.image_info = {}
+        self.max_workers = DEFAULT_WORKERS
+        self.max_bytes = 0
+        self.profile_stages = False
+        self.encoder_profile = DEFAULT_ENCODER_PROFILE
+        self.memory_budget = 0
+        self.passthrough = True  # 已满足输出要求的图片直接复制
+        self.manifest = None
+        self.events = EventChannel()
+        self.batch_running = False
+        self.batch_cancelled = False
+        self.batch_report = BatchReport()
+        self.batch_meter = ThroughputMeter(0)
+        self.batch_profile = BatchProfile()
+        self.thumbnail_disk_cache = ThumbnailDiskCache()
+        # 磁盘缓存命中不受同时解码数量的限制
+        self.thumbnail_loader = ThumbnailLoader(
+            self.thumbnail_disk_cache.create,
+            lookup_func=self.thumbnail_disk_cache.get,
+        )
+        self.grid = None
+        self.scan_cancel = None
+        self.scan_generation = 0
+        self.metadata_index = None  # 第一次批处理时再打开
+        self.hot_folder = None  # 正在监视的文件夹
+        self.watch_report = BatchReport()
+        self.watch_latencies = []
 
     def select_images(self):
         """选择图片文件"""
-        self.selected_thumbnails.clear()
+        self.cancel_scan()
+        self.selected_paths.clear()
         self.image_paths = list(
             filedialog.askopenfilenames(
                 filetypes=[
-                    ("Image files", "*.jpg;*.jpeg;*.png;*.heic;*.heif;*.webp;*.avif")
+                    (
+                        "Image files",
+                        ";".join(f"*{ext}" for ext in SUPPORTED_EXTENSIONS),
+                    )
                 ]
             )
         )
         if self.image_paths:
-            self.image_info = {path: os.path.getsize(path) for path in self.image_paths}
+            # 文件大小在单元格显示时才读取
+            self.image_info = dict.fromkeys(self.image_paths)
             self.show_thumbnails()
             # 更新 image_count_label 的文本
             image_count_label.config(text=f"已选择 {len(self.image_paths)} 张图片")
@@ -56,153 +326,165 @@ class ImageProcessor:
             # 如果没有选择图片，恢复默认提示
             image_count_label.config(text="未选择图片")
 
-    def show_thumbnails(self):
-        """显示缩略图"""
-        for widget in thumbnail_frame.winfo_children():
-            widget.destroy()
-
-        if not self.image_paths:
+    def select_folder(self):
+        """添加文件夹（含子文件夹）中的图片，边扫描边显示"""
+        folder = filedialog.askdirectory()
+        if not folder:
             return
-
-        frame_width = thumbnail_frame.winfo_width() or 600
-        columns = max(
-            1, (frame_width - PADDING - SCROLLBAR_WIDTH) // (THUMBNAIL_SIZE + PADDING)
+        self.cancel_scan()
+        self.scan_generation += 1
+        self.scan_cancel = threading.Event()
+        if self.grid is None:
+            self.show_thumbnails()
+        image_count_label.config(
+            text=f"已选择 {len(self.image_paths)} 张图片（扫描中…）"
         )
-
-        canvas = tk.Canvas(thumbnail_frame)
-        scrollbar = ttk.Scrollbar(
-            thumbnail_frame, orient="vertical", command=canvas.yview
+        thread = threading.Thread(
+            target=self.scan_folder,
+            args=(folder, self.scan_generation, self.scan_cancel),
+            daemon=True,
         )
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.update_idletasks()
-        scrollable_frame.config(width=frame_width - SCROLLBAR_WIDTH)
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        def on_configure(event):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-
-        scrollable_frame.bind("<Configure>", on_configure)
-
-        # 绑定鼠标滚轮事件
-        def on_mousewheel(event):
-            canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-
-        canvas.bind_all("<MouseWheel>", on_mousewheel)
+        thread.start()
 
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+    def scan_folder(self, folder, generation, cancel_event):
+        """扫描文件夹（在后台线程运行），结果分批通过事件通道送到界面"""
+        try:
+            for batch in scan_batches(folder, cancel_event=cancel_event):
+                self.events.post("scan", (generation, batch))
+        except Exception as e:
+            self.events.post("error", str(e))
+        finally:
+            self.events.post("scan_done", generation)
 
-        for index, image_path in enumerate(self.image_paths):
-            self.create_thumbnail(
-                scrollable_frame, image_path, index, columns, THUMBNAIL_SIZE, PADDING
+    def add_scanned(self, generation, batch):
+        """把扫描到的一批图片追加到列表（在 Tk 线程中调用）"""
+        if generation != self.scan_generation or self.scan_cancel is None:
+            return
+        added = False
+        for path, size in batch:
+            if path not in self.image_info:
+                self.image_paths.append(path)
+                self.image_info[path] = size
+                added = True
+        if added:
+            self.grid.extend()
+            image_count_label.config(
+                text=f"已选择 {len(self.image_paths)} 张图片（扫描中…）"
             )
 
-        for index, image_path in enumerate(self.image_paths):
-            self.create_thumbnail(
-                scrollable_frame, image_path, index, columns, THUMBNAIL_SIZE, PADDING
+    def finish_scan(self, generation):
+        """扫描结束或被取消"""
+        if generation != self.scan_generation:
+            return
+        self.scan_cancel = None
+        image_count_label.config(
+            text=(
+                f"已选择 {len(self.image_paths)} 张图片"
+                if self.image_paths
+                else "未选择图片"
             )
-
-        thumbnail_frame.update_idletasks()
-
-    def create_thumbnail(
-        self, parent, image_path, index, columns, thumbnail_size, padding
-    ):
-        """创建单个缩略图"""
-        row = index // columns
-        col = index % columns
-
-        frame = ttk.Frame(parent, style="TFrame", padding=3)
-        frame.grid(row=row, column=col, padx=padding, pady=padding)
-        frame.image_path = image_path
-
-        file_name = os.path.basename(image_path)
-        file_name = file_name[:12] + "..." if len(file_name) > 15 else file_name
-        file_size = self.image_info[image_path]
-        size_str = self.format_file_size(file_size)
-
-        thumbnail_label = ttk.Label(frame, text="加载中...", width=thumbnail_size // 10)
-        thumbnail_label.pack()
-
-        text_label = ttk.Label(
-            frame,
-            text=f"{file_name} ({size_str})",
-            wraplength=thumbnail_size,
-            justify="center",
-            padding=(0, 2, 0, 2),
-            style="TLabel",
         )
-        text_label.pack()
 
-        self.load_thumbnail_async(thumbnail_label, image_path)
+    def cancel_scan(self):
+        """停止正在进行的文件夹扫描，已找到的图片保留"""
+        if self.scan_cancel is not None:
+            self.scan_cancel.set()
+            self.finish_scan(self.scan_generation)
 
-        frame.bind("<Button-1>", lambda event: self.on_thumbnail_click(event, frame))
-        thumbnail_label.bind(
-            "<Button-1>", lambda event: self.on_thumbnail_click(event, frame)
-        )
-        text_label.bind(
-            "<Button-1>", lambda event: self.on_thumbnail_click(event, frame)
-        )
+    def file_size(self, image_path):
+        """文件大小（首次显示时读取并缓存）"""
+        size = self.image_info.get(image_path)
+        if size is None:
+            try:
+                size = os.path.getsize(image_path)
+            except OSError:
+                size = 0
+            self.image_info[image_path] = size
+        return size
 
-    def load_thumbnail_async(self, thumbnail_label, image_path):
-        """异步加载缩略图"""
+    def show_thumbnails(self):
+        """显示缩略图"""
+        # 网格重建时作废所有排队中的缩略图请求
+        self.thumbnail_loader.cancel_all()
+        if self.grid is None:
+            self.grid = ThumbnailGrid(thumbnail_frame, self)
+        self.grid.reset()
+
+    def load_thumbnail_async(self, image_path, priority=PRIORITY_VISIBLE):
+        """异步加载缩略图（由固定大小的线程池处理）"""
+        img = self.thumbnail_cache.get(image_path)
+        if img is not None:
+            self.show_thumbnail_image(image_path, img)
+            return
 
-        def load_thumbnail():
-            try:
-                if image_path in self.thumbnail_cache:
-                    img_tk = self.thumbnail_cache[image_path]
-                else:
-                    with Image.open(image_path) as img:
-                        # 修复方向问题
-                        img = ImageOps.exif_transpose(img)  # 新增代码
-                        img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
-                        img_tk = ImageTk.PhotoImage(img)
-                        self.thumbnail_cache[image_path] = img_tk
+        def on_loaded(path, img, error):
+            # 在工作线程中回调，像素先放入内存缓存，PhotoImage 在 Tk 线程中创建
+            if img is not None:
+                self.thumbnail_cache.put(path, img)
+            self.events.post("thumbnail", (path, img, error))
+
+        self.thumbnail_loader.submit(image_path, on_loaded, priority)
 
-                def update_thumbnail():
-                    thumbnail_label.configure(image=img_tk, text="")
-                    thumbnail_label.image = img_tk
+    def log_cache_stats(self):
+        """输出本次运行的缩略图缓存统计，并追加到缓存目录的 thumbnail-cache.jsonl
 
-                root.after(0, update_thumbnail)
-            except Exception as e:
-                print(f"加载缩略图失败: {e}")
+        用于调整内存和磁盘缓存的预算；没有加载过缩略图时不记录。
+        """
+        memory = self.thumbnail_cache.stats()
+        if not memory["hits"] + memory["misses"]:
+            return
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "memory": memory,
+            "disk": self.thumbnail_disk_cache.stats(),
+        }
+        if sys.stderr is not None:
+            print(json.dumps(record), file=sys.stderr)
+        try:
+            os.makedirs(user_cache_dir(), exist_ok=True)
+            with open(os.path.join(user_cache_dir(), CACHE_LOG_NAME), "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+    def apply_thumbnail(self, image_path, img, error):
+        """缩略图加载完成后更新界面（只在 Tk 线程调用）"""
+        if self.grid is None:
+            return
+        if error is not None:
+            print(f"加载缩略图失败: {error}")
+            for cell in self.grid.cells_for(image_path):
+                cell.set_text("加载失败")
+            return
+        self.show_thumbnail_image(image_path, img)
 
-                def show_error():
-                    thumbnail_label.configure(text="加载失败")
+    def show_thumbnail_image(self, image_path, img):
+        """为正在显示该图片的单元格创建 PhotoImage（只在 Tk 线程调用）"""
+        cells = self.grid.cells_for(image_path)
+        if not cells:
+            return
+        from PIL import ImageTk  # 第一张缩略图出现时才加载
 
-                root.after(0, show_error)
+        img_tk = ImageTk.PhotoImage(img)
+        for cell in cells:
+            cell.set_image(img_tk)
 
-        threading.Thread(target=load_thumbnail, daemon=True).start()
+    def release_thumbnail(self, image_path):
+        """单元格滚出可见范围时，取消尚未开始的加载"""
+        self.thumbnail_loader.cancel(image_path)
 
-    def on_thumbnail_click(self, event, frame):
+    def on_thumbnail_click(self, event, image_path):
         """处理缩略图点击事件"""
+        if image_path is None:
+            return
         if event.state & 0x4:  # Ctrl键按下
-            if frame in self.selected_thumbnails:
-                self.selected_thumbnails.remove(frame)
-                frame.config(style="TFrame")
-                for child in frame.winfo_children():
-                    if isinstance(child, ttk.Label):
-                        child.config(style="TLabel")
+            if image_path in self.selected_paths:
+                self.selected_paths.remove(image_path)
             else:
-                self.selected_thumbnails.append(frame)
-                frame.config(style="Selected.TFrame")
-                for child in frame.winfo_children():
-                    if isinstance(child, ttk.Label):
-                        child.config(style="Selected.TLabel")
+                self.selected_paths.add(image_path)
         else:
-            for f in self.selected_thumbnails:
-                f.config(style="TFrame")
-                for child in f.winfo_children():
-                    if isinstance(child, ttk.Label):
-                        child.config(style="TLabel")
-            self.selected_thumbnails.clear()
-            self.selected_thumbnails.append(frame)
-            frame.config(style="Selected.TFrame")
-            for child in frame.winfo_children():
-                if isinstance(child, ttk.Label):
-                    child.config(style="Selected.TLabel")
+            self.selected_paths = {image_path}
+        self.grid.update_selection()
 
     def format_file_size(self, file_size):
         """格式化文件大小"""
@@ -217,23 +499,28 @@ class ImageProcessor:
         """开始处理图片"""
         if not self.validate_processing():
             return
-        output_format = output_format_var.get()
-        total_images = len(self.image_paths)
+        self.start_batch(output_format_var.get(), list(self.image_paths))
+
+    def start_batch(self, output_format, image_paths):
+        """在后台线程中启动批处理（在 Tk 线程中调用）"""
+        if self.batch_running or self.hot_folder is not None:
+            messagebox.showinfo("提示", "正在处理中，请等待当前任务完成")
+            return
+        self.update_batch_options()
+        compression_quality = int(compression_scale.get())
+        self.batch_running = True
+        self.batch_report = BatchReport(total=len(image_paths))
+        self.batch_meter = ThroughputMeter(len(image_paths))
+        self.batch_profile = BatchProfile()
+        self.update_progress()
 
         thread = threading.Thread(
-            target=self.process_images, args=(output_format, total_images)
+            target=self.process_images,
+            args=(output_format, compression_quality, image_paths),
+            daemon=True,
         )
         thread.start()
 
-    def process_images(self, output_format, total_images, image_paths=None):
-        """批量处理图片"""
-        image_paths = image_paths or self.image_paths
-        for i, image_path in enumerate(image_paths, start=1):
-            self.process_single_image(image_path, output_format, i, total_images)
-        self.reset_progress()
-        if messagebox.askyesno("完成", "图片处理完成，是否打开输出目录？"):
-            self.open_output_folder()
-
     def open_output_folder(self):
         """打开输出文件夹"""
         if os.name == "nt":  # Windows
@@ -244,6 +531,26 @@ class ImageProcessor:
             else:  # Linux
                 subprocess.Popen(["xdg-open", self.output_folder])
 
+    def update_batch_options(self):
+        """读取界面上的并行进程数、文件大小上限、内存上限、编码配置、
+        是否直接复制和是否记录各阶段耗时
+        """
+        try:
+            self.max_workers = max(1, int(workers_var.get()))
+        except (tk.TclError, ValueError):
+            self.max_workers = DEFAULT_WORKERS
+        try:
+            self.max_bytes = max(0, int(max_size_var.get())) * 1024
+        except (tk.TclError, ValueError):
+            self.max_bytes = 0
+        self.profile_stages = bool(profile_var.get())
+        self.passthrough = bool(passthrough_var.get())
+        self.encoder_profile = encoder_profile_var.get()
+        try:
+            self.memory_budget = max(0, int(memory_budget_var.get())) * 1024 * 1024
+        except (tk.TclError, ValueError):
+            self.memory_budget = 0
+
     def validate_processing(self):
         """验证处理条件"""
         if not self.image_paths:
@@ -254,137 +561,307 @@ class ImageProcessor:
             return False
         return True
 
-    def process_single_image(self, image_path, output_format, current, total):
-        """处理单张图片"""
-        try:
-            file_name = os.path.splitext(os.path.basename(image_path))[0]
-            compression_quality = int(compression_scale.get())
-
-            output_path = self.get_output_path(image_path, output_format, file_name)
-
-            if os.path.exists(output_path):
-                action = self.handle_file_conflict(output_path)
-                if action == "skip":
-                    self.update_progress(current, total)
-                    return
-                elif action == "cancel":
-                    raise Exception("操作已取消")
-
-            if output_format == "original" and compression_quality == 100:
-                shutil.copy2(image_path, output_path)
-            elif output_format == "朋友圈适用":
-                self.save_image_for_wechat(image_path, output_path, compression_quality)
-            else:
-                self.save_image(
-                    image_path, output_path, output_format, compression_quality
-                )
-
-            self.update_progress(current, total)
-        except PermissionError:
-            messagebox.showerror("错误", f"没有权限访问文件: {image_path}")
-        except Exception as e:
-            messagebox.showerror("错误", f"处理图片 {image_path} 时出错: {str(e)}")
-
     def process_selected_images(self):
         """处理选中的图片"""
         if not self.validate_processing():
             return
         output_format = output_format_var.get()
-        selected_image_paths = [frame.image_path for frame in self.selected_thumbnails]
-        total_images = len(selected_image_paths)
+        selected_image_paths = [
+            path for path in self.image_paths if path in self.selected_paths
+        ]
 
         if not selected_image_paths:
             messagebox.showerror("错误", "请选择要处理的图片")
             return
 
+        self.start_batch(output_format, selected_image_paths)
+
+    def process_images(self, output_format, compression_quality, image_paths):
+        """批量处理图片（在后台线程运行，只通过事件通道与界面通信）"""
+        self.manifest = BatchManifest(self.output_folder)
+        try:
+            # 一次算好所有输出路径并找出冲突，需要时只询问一次处理方式
+            planned = plan_jobs(
+                image_paths,
+                self.output_folder,
+                output_format,
+                compression_quality,
+                self.ask_conflict_policy,
+                self.max_bytes,
+                self.manifest,
+                self.profile_stages,
+                self.encoder_profile,
+            )
+            if planned is None:
+                self.events.post("cancelled")
+                planned = [], []
+            jobs, skipped = planned
+            for result in skipped:
+                self.events.post("result", result)
+            jobs_by_output = {job.output_path: job for job in jobs}
+
+            # 按完成顺序回收结果，错误只记录到报告中，不中断批处理
+            if self.metadata_index is None:
+                self.metadata_index = MetadataIndex()
+            engine = BatchEngine(
+                self.max_workers,
+                dedup=True,
+                metadata=self.metadata_index,
+                memory_budget=self.memory_budget,
+                passthrough=self.passthrough,
+            )
+            for result in engine.run(jobs):
+                if result.status == "ok":
+                    self.manifest.record(jobs_by_output[result.output_path], result)
+                self.events.post("result", result)
+            self.events.post("pipeline", engine.pipeline.to_dict())
+        except Exception as e:
+            self.events.post("error", str(e))
+        finally:
+            self.manifest.close()
+            self.manifest = None
+            self.events.post("done")
+
+    def toggle_watch(self):
+        """开始或停止监视文件夹：新图片写完后按当前设置自动转换"""
+        if self.hot_folder is not None:
+            self.hot_folder.stop()
+            watch_button.config(text="正在停止…", state=tk.DISABLED)
+            return
+        if self.batch_running:
+            messagebox.showinfo("提示", "正在处理中，请等待当前任务完成")
+            return
+        if not self.output_folder:
+            messagebox.showerror("错误", "请选择输出位置")
+            return
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+        if not folder:
+            return
+        if os.path.abspath(folder) == os.path.abspath(self.output_folder):
+            messagebox.showerror("错误", "监视目录和输出目录不能相同")
+            return
+
+        self.update_batch_options()
+        if self.metadata_index is None:
+            self.metadata_index = MetadataIndex()
+        engine = BatchEngine(
+            self.max_workers,
+            metadata=self.metadata_index,
+            memory_budget=self.memory_budget,
+            passthrough=self.passthrough,
+        )
+        self.hot_folder = HotFolder(
+            folder,
+            self.output_folder,
+            output_format_var.get(),
+            int(compression_scale.get()),
+            engine,
+            # 监视时无法逐批询问，同名输出自动重命名
+            policy="rename",
+            max_bytes=self.max_bytes,
+            manifest=BatchManifest(self.output_folder),
+            profile=self.profile_stages,
+            encoder_profile=self.encoder_profile,
+            on_result=lambda result, latency: self.events.post(
+                "watch_result", (result, latency)
+            ),
+        )
+        self.watch_report = BatchReport()
+        self.watch_latencies = []
+        self.batch_profile = BatchProfile()
+        watch_button.config(text="停止监视")
+        throughput_label.config(text=f"监视中: {folder}")
         thread = threading.Thread(
-            target=self.process_images,
-            args=(output_format, total_images, selected_image_paths),
+            target=self.watch_folder, args=(self.hot_folder,), daemon=True
         )
         thread.start()
 
-    def process_images(self, output_format, total_images, image_paths=None):
-        """批量处理图片"""
-        image_paths = image_paths or self.image_paths
-        for i, image_path in enumerate(image_paths, start=1):
-            self.process_single_image(image_path, output_format, i, total_images)
+    def watch_folder(self, hot_folder):
+        """运行热文件夹直到停止（在后台线程运行）"""
+        try:
+            hot_folder.run()
+        except Exception as e:
+            self.events.post("watch_done", str(e))
+        else:
+            self.events.post("watch_done", "")
+        finally:
+            hot_folder.plan_options["manifest"].close()
+
+    def show_watch_result(self, result, latency):
+        """与批处理一样把结果计入报告，并显示转换数量、失败数和延迟中位数"""
+        report = self.watch_report
+        report.total += 1
+        report.add(result)
+        self.batch_profile.add(result)
+        if result.status == "ok":
+            self.watch_latencies.append(latency)
+        median = percentile(sorted(self.watch_latencies[-1000:]), 50)
+        text = f"监视中: 已转换 {report.converted} 张"
+        if report.failed:
+            text += f"，失败 {report.failed} 张"
+        throughput_label.config(text=f"{text}，延迟中位数 {median:.1f} 秒")
+
+    def finish_watch(self, error):
+        """监视结束后汇总；有失败或警告时和批处理一样保存报告"""
+        self.hot_folder = None
+        report = self.watch_report
+        watch_button.config(text="监视文件夹…", state=tk.NORMAL)
+        text = f"监视结束: 共转换 {report.converted} 张"
+        if report.failed:
+            text += f"，失败 {report.failed} 张"
+        if self.profile_stages and self.batch_profile.files:
+            profile_path = self.save_batch_profile()
+            if profile_path:
+                text += f"，各阶段耗时: {profile_path}"
+        throughput_label.config(text=text)
+        if error:
+            messagebox.showerror("错误", f"监视文件夹失败: {error}")
+        elif report.errors or report.warnings:
+            summary = text
+            if report.over_limit:
+                summary += f"\n{report.over_limit} 张图片在最低质量下仍超出大小上限"
+            if report.errors:
+                summary += "\n\n" + "\n".join(self.error_lines(report))
+            report_path = self.save_batch_report(report)
+            if report_path:
+                summary += f"\n\n完整报告: {report_path}"
+            messagebox.showwarning("监视结束", summary)
+
+    def pump_events(self):
+        """在 Tk 线程中定时处理事件，进度刷新合并为每个周期一次"""
+        progress_changed = False
+        finished = False
+        for kind, payload in self.events.drain():
+            if kind == "result":
+                self.batch_report.add(payload)
+                self.batch_profile.add(payload)
+                self.batch_meter.add(1, payload.input_bytes)
+                progress_changed = True
+            elif kind == "thumbnail":
+                self.apply_thumbnail(*payload)
+            elif kind == "scan":
+                self.add_scanned(*payload)
+            elif kind == "scan_done":
+                self.finish_scan(payload)
+            elif kind == "conflicts":
+                self.show_conflict_dialog(*payload)
+            elif kind == "pipeline":
+                self.batch_report.pipeline = payload
+            elif kind == "watch_result":
+                self.show_watch_result(*payload)
+            elif kind == "watch_done":
+                self.finish_watch(payload)
+            elif kind == "error":
+                self.batch_report.errors.append({"path": "", "error": payload})
+            elif kind == "cancelled":
+                self.batch_cancelled = True
+            elif kind == "done":
+                finished = True
+
+        if progress_changed:
+            self.update_progress()
+        if finished:
+            self.finish_batch()
+        root.after(EVENT_INTERVAL_MS, self.pump_events)
+
+    def finish_batch(self):
+        """批处理结束后汇总结果"""
+        report = self.batch_report
+        report.elapsed = self.batch_meter.elapsed
+        self.batch_running = False
+        cancelled = self.batch_cancelled
+        self.batch_cancelled = False
         self.reset_progress()
-        if messagebox.askyesno("完成", "图片处理完成，是否打开输出目录？"):
+
+        summary = (
+            f"转换 {report.converted} 张，跳过 {report.skipped + report.unchanged} 张，"
+            f"失败 {report.failed} 张，用时 {format_duration(report.elapsed)}"
+        )
+        if report.peak_rss:
+            summary += f"，峰值内存 {self.format_file_size(report.peak_rss)}"
+        if report.low_memory:
+            summary += f"\n{report.low_memory} 张大图使用了低内存模式"
+        if report.passthrough:
+            summary += f"\n{report.passthrough} 张图片已满足输出要求，直接复制"
+        if report.over_limit:
+            summary += f"\n{report.over_limit} 张图片在最低质量下仍超出大小上限"
+        if report.errors:
+            summary += "\n\n" + "\n".join(self.error_lines(report))
+        if report.errors or report.warnings:
+            report_path = self.save_batch_report(report)
+            if report_path:
+                summary += f"\n\n完整报告: {report_path}"
+        if self.profile_stages and self.batch_profile.files:
+            profile_path = self.save_batch_profile()
+            if profile_path:
+                summary += f"\n\n各阶段耗时: {profile_path}"
+
+        if cancelled:
+            messagebox.showinfo("已取消", f"操作已取消：{summary}")
+        elif messagebox.askyesno(
+            "完成", f"图片处理完成：{summary}\n\n是否打开输出目录？"
+        ):
             self.open_output_folder()
 
-    def get_output_path(self, image_path, output_format, file_name):
-        """获取输出路径"""
-        if output_format == "original":
-            return Path(self.output_folder) / os.path.basename(image_path)
-        elif output_format == "朋友圈适用":
-            return Path(self.output_folder) / f"{file_name}_wechat.jpg"
-        else:
-            return Path(self.output_folder) / f"{file_name}.{output_format}"
-
-    def save_image(self, image_path, output_path, output_format, compression_quality):
-        """保存图片"""
-        with Image.open(image_path) as img:
-            img = ImageOps.exif_transpose(img)  # 新增代码
-            exif_data = img.info.get("exif")
-            if compression_quality < 100:
-                (
-                    img.save(output_path, quality=compression_quality, exif=exif_data)
-                    if output_format == "webp"
-                    else img.save(output_path, quality=compression_quality)
-                )
-            else:
-                (
-                    img.save(
-                        output_path,
-                        quality=compression_quality,
-                        lossless=True,
-                        exif=exif_data,
-                    )
-                    if output_format == "webp"
-                    else img.save(output_path, lossless=True)
-                )
-
-    def save_image_for_wechat(self, image_path, output_path, compression_quality):
-        """保存为朋友圈适用格式的图片"""
-        with Image.open(image_path) as img:
-            # 计算新的分辨率
-            img = ImageOps.exif_transpose(img)
-            exif_data = img.info.get("exif")
-            width, height = img.size
-            if width > height:
-                new_width = int(width * 1080 / height)
-                new_height = 1080
-            else:
-                new_width = 1080
-                new_height = int(height * 1080 / width)
+    @staticmethod
+    def error_lines(report, limit=5):
+        """报告中前 limit 个错误的摘要行"""
+        lines = [
+            f"{os.path.basename(error['path'])}: {error['error']}"
+            for error in report.errors[:limit]
+        ]
+        if len(report.errors) > limit:
+            lines.append(f"……共 {len(report.errors)} 个错误")
+        return lines
+
+    def save_batch_report(self, report):
+        """把批处理报告写入输出目录，返回文件路径"""
+        report_path = os.path.join(self.output_folder, BATCH_REPORT_NAME)
+        try:
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存批处理报告失败: {e}")
+            return None
+        return report_path
+
+    def save_batch_profile(self):
+        """把各阶段耗时导出为 JSON（含逐文件记录）和 CSV（汇总表），返回 JSON 路径"""
+        base_path = os.path.join(self.output_folder, BATCH_PROFILE_NAME)
+        try:
+            self.batch_profile.save(base_path + ".json")
+            self.batch_profile.save(base_path + ".csv")
+        except OSError as e:
+            print(f"保存耗时记录失败: {e}")
+            return None
+        return base_path + ".json"
 
-            # 调整图片大小
-            img = img.resize((new_width, new_height), Image.LANCZOS)
+    def ask_conflict_policy(self, conflicts):
+        """在后台线程中调用：请 Tk 线程弹出一次冲突对话框，等待并返回选择的策略
 
-            # 保存图片
-            img.save(
-                output_path, format="JPEG", quality=compression_quality, exif=exif_data
-            )
+        返回 "overwrite" / "skip" / "rename"，取消时返回 None。
+        """
+        reply = Future()
+        self.events.post("conflicts", (conflicts, reply))
+        return reply.result()
 
-    def handle_file_conflict(self, file_path):
-        """处理文件冲突"""
+    def show_conflict_dialog(self, conflicts, reply):
+        """在 Tk 线程中询问已存在的输出文件如何处理（整批只问一次）"""
 
         class ConflictDialog(tk.Toplevel):
             def __init__(self, parent):
                 super().__init__(parent)
                 self.result = None
-                self.apply_to_all = tk.BooleanVar()
 
                 self.title("文件已存在")
-                self.geometry("400x150")
+                self.geometry("420x180")
                 self.resizable(False, False)
 
-                message = f"文件 '{os.path.basename(file_path)}' 已存在，要如何处理？"
-                ttk.Label(self, text=message, wraplength=380).pack(pady=10, padx=10)
-
-                ttk.Checkbutton(
-                    self, text="应用到所有文件", variable=self.apply_to_all
-                ).pack()
+                names = "、".join(os.path.basename(path) for path in conflicts[:3])
+                if len(conflicts) > 3:
+                    names += " 等"
+                message = f"输出目录中已有 {len(conflicts)} 个同名文件（{names}），要如何处理？"
+                ttk.Label(self, text=message, wraplength=400).pack(pady=10, padx=10)
 
                 btn_frame = ttk.Frame(self)
                 btn_frame.pack(pady=10)
@@ -396,7 +873,12 @@ class ImageProcessor:
                     btn_frame, text="跳过", command=lambda: self.set_result("skip")
                 ).pack(side=tk.LEFT, padx=5)
                 ttk.Button(
-                    btn_frame, text="取消", command=lambda: self.set_result("cancel")
+                    btn_frame,
+                    text="自动重命名",
+                    command=lambda: self.set_result("rename"),
+                ).pack(side=tk.LEFT, padx=5)
+                ttk.Button(
+                    btn_frame, text="取消", command=lambda: self.set_result(None)
                 ).pack(side=tk.LEFT, padx=5)
 
                 self.transient(parent)
@@ -404,34 +886,31 @@ class ImageProcessor:
                 parent.wait_window(self)
 
             def set_result(self, value):
-                self.result = (value, self.apply_to_all.get())
+                self.result = value
                 self.destroy()
 
-        if hasattr(self.handle_file_conflict, "global_action"):
-            return self.handle_file_conflict.global_action
-
         dialog = ConflictDialog(root)
-        if dialog.result is None:
-            return "cancel"
-
-        action, apply_to_all = dialog.result
+        reply.set_result(dialog.result)
 
-        if apply_to_all:
-            self.handle_file_conflict.global_action = action
-
-        return action
-
-    def update_progress(self, current, total):
-        """更新进度条"""
-        progress = (current / total) * 100
+    def update_progress(self):
+        """更新进度条、吞吐量和剩余时间（只在 Tk 线程调用）"""
+        meter = self.batch_meter
+        progress = (meter.done / meter.total) * 100 if meter.total else 100.0
         progress_bar["value"] = progress
-        progress_label.config(text=f"{current}/{total} ({progress:.1f}%)")
-        root.update_idletasks()
+        progress_label.config(text=f"{meter.done}/{meter.total} ({progress:.1f}%)")
+        throughput_label.config(
+            text=(
+                f"{meter.images_per_second:.1f} 张/秒  "
+                f"{meter.mb_per_second:.1f} MB/秒  "
+                f"剩余 {format_duration(meter.eta)}"
+            )
+        )
 
     def reset_progress(self):
         """重置进度条"""
         progress_bar["value"] = 0
         progress_label.config(text="0/0 (0.0%)")
+        throughput_label.config(text="")
 
     def select_output_folder(self):
         """选择输出文件夹"""
@@ -443,20 +922,25 @@ class ImageProcessor:
 
     def delete_selected_image(self):
         """删除选中的图片"""
-        if self.selected_thumbnails:
-            for frame in self.selected_thumbnails:
-                image_path = frame.image_path
-                self.image_paths.remove(image_path)
-                self.thumbnail_cache.pop(image_path, None)
-                frame.destroy()
-            self.selected_thumbnails.clear()
+        if self.selected_paths:
+            self.image_paths = [
+                path for path in self.image_paths if path not in self.selected_paths
+            ]
+            for image_path in self.selected_paths:
+                self.thumbnail_cache.pop(image_path)
+                self.image_info.pop(image_path, None)
+            self.selected_paths.clear()
             self.show_thumbnails()
             # 更新 image_count_label 的文本
             image_count_label.config(text=f"已选择 {len(self.image_paths)} 张图片")
 
     def clear_all_images(self):
         """清除所有图片"""
+        self.cancel_scan()
         self.image_paths = []
+        self.image_info = {}
+        self.selected_paths.clear()
+        self.thumbnail_cache.clear()
         self.show_thumbnails()
         # 更新 image_count_label 的文本
         image_count_label.config(text="未选择图片")
@@ -469,6 +953,13 @@ class ImageConverterApp:
         self.root = root
         self.image_processor = ImageProcessor()
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.image_processor.pump_events()
+
+    def on_close(self):
+        """关闭窗口前记录缩略图缓存统计"""
+        self.image_processor.log_cache_stats()
+        self.root.destroy()
 
     def setup_ui(self):
         """设置 UI 布局"""
@@ -476,22 +967,7 @@ class ImageConverterApp:
         self.root.geometry("800x750")
         self.root.minsize(600, 720)
 
-        style = ttk.Style()
-        style.configure("TFrame", padding=5)
-        style.configure(
-            "Selected.TFrame",
-            background="#e5f3ff",
-            bordercolor="#0078d4",
-            borderwidth=1,
-            relief="solid",
-            padding=3,
-        )
-        style.configure(
-            "TLabel",
-            background=style.lookup("TFrame", "background"),
-            padding=2,
-        )
-        style.configure("Selected.TLabel", background="#e5f3ff", padding=2)
+        self.configure_styles()
 
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -511,6 +987,34 @@ class ImageConverterApp:
         thumbnail_frame = ttk.Frame(preview_frame)
         thumbnail_frame.pack(fill=tk.BOTH, expand=True)
 
+    def configure_styles(self):
+        """设置单元格选中状态等自定义样式"""
+        style = ttk.Style()
+        style.configure("TFrame", padding=5)
+        style.configure(
+            "Selected.TFrame",
+            background="#e5f3ff",
+            bordercolor="#0078d4",
+            borderwidth=1,
+            relief="solid",
+            padding=3,
+        )
+        style.configure(
+            "TLabel",
+            background=style.lookup("TFrame", "background"),
+            padding=2,
+        )
+        style.configure("Selected.TLabel", background="#e5f3ff", padding=2)
+
+    def apply_theme(self):
+        """窗口显示后再加载 ttkthemes 主题（样式按主题保存，需要重新设置）"""
+        try:
+            from ttkthemes import ThemedStyle
+        except ImportError:
+            return
+        ThemedStyle(self.root).set_theme(THEME_NAME)
+        self.configure_styles()
+
     def setup_file_frame(self, parent):
         """设置文件选择区域"""
         file_frame = ttk.Frame(parent)
@@ -521,6 +1025,24 @@ class ImageConverterApp:
         )
         select_images_button.pack(fill=tk.X, pady=2)
 
+        select_folder_button = ttk.Button(
+            file_frame,
+            text="添加文件夹（含子文件夹）",
+            command=self.image_processor.select_folder,
+        )
+        select_folder_button.pack(fill=tk.X, pady=2)
+
+        cancel_scan_button = ttk.Button(
+            file_frame, text="停止扫描", command=self.image_processor.cancel_scan
+        )
+        cancel_scan_button.pack(fill=tk.X, pady=2)
+
+        global watch_button
+        watch_button = ttk.Button(
+            file_frame, text="监视文件夹…", command=self.image_processor.toggle_watch
+        )
+        watch_button.pack(fill=tk.X, pady=2)
+
         global image_count_label
         image_count_label = ttk.Label(file_frame, text="未选择图片")
         image_count_label.pack(fill=tk.X, pady=2)
@@ -549,16 +1071,15 @@ class ImageConverterApp:
         output_frame = ttk.LabelFrame(parent, text="输出选项", padding="5")
         output_frame.pack(fill=tk.X, pady=10)
 
-        formats = ["original", "jpg", "heic", "heif", "webp", "avif", "朋友圈适用"]
         global output_format_var
         output_format_var = tk.StringVar(value="original")
-        for format in formats:
+        for format in OUTPUT_FORMATS:
             ttk.Radiobutton(
                 output_frame,
                 text=(
                     "原始格式"
                     if format == "original"
-                    else format.upper() if format != "朋友圈适用" else "朋友圈适用"
+                    else format.upper() if format != WECHAT_FORMAT else WECHAT_FORMAT
                 ),
                 variable=output_format_var,
                 value=format,
@@ -597,6 +1118,72 @@ class ImageConverterApp:
         compression_scale.bind("<Motion>", self.update_compression_value)
         compression_scale.bind("<ButtonRelease-1>", self.update_compression_value)
 
+        max_size_label = ttk.Label(output_frame, text="文件大小上限 KB (0 不限制):")
+        max_size_label.pack(fill=tk.X, pady=2)
+
+        global max_size_var
+        max_size_var = tk.IntVar(value=0)
+        ttk.Spinbox(
+            output_frame,
+            from_=0,
+            to=100000,
+            increment=50,
+            textvariable=max_size_var,
+            width=8,
+        ).pack(fill=tk.X)
+
+        encoder_profile_label = ttk.Label(output_frame, text="编码速度:")
+        encoder_profile_label.pack(fill=tk.X, pady=2)
+
+        global encoder_profile_var
+        encoder_profile_var = tk.StringVar(value=DEFAULT_ENCODER_PROFILE)
+        for profile in ENCODER_PROFILES:
+            ttk.Radiobutton(
+                output_frame,
+                text=ENCODER_PROFILE_LABELS[profile],
+                variable=encoder_profile_var,
+                value=profile,
+            ).pack(anchor=tk.W, pady=2)
+
+        workers_label = ttk.Label(output_frame, text="并行进程数:")
+        workers_label.pack(fill=tk.X, pady=2)
+
+        global workers_var
+        workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        ttk.Spinbox(
+            output_frame,
+            from_=1,
+            to=max(DEFAULT_WORKERS * 2, 1),
+            textvariable=workers_var,
+            width=5,
+        ).pack(fill=tk.X)
+
+        memory_budget_label = ttk.Label(output_frame, text="内存上限 MB (0 自动):")
+        memory_budget_label.pack(fill=tk.X, pady=2)
+
+        global memory_budget_var
+        memory_budget_var = tk.IntVar(value=0)
+        ttk.Spinbox(
+            output_frame,
+            from_=0,
+            to=1024 * 1024,
+            increment=512,
+            textvariable=memory_budget_var,
+            width=8,
+        ).pack(fill=tk.X)
+
+        global passthrough_var
+        passthrough_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            output_frame, text="已是输出格式时直接复制", variable=passthrough_var
+        ).pack(anchor=tk.W, pady=2)
+
+        global profile_var
+        profile_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(output_frame, text="记录各阶段耗时", variable=profile_var).pack(
+            anchor=tk.W, pady=2
+        )
+
     def setup_progress_frame(self, parent):
         """设置进度条区域"""
 
@@ -625,6 +1212,10 @@ class ImageConverterApp:
         progress_label = ttk.Label(progress_frame, text="0/0 (0.0%)")
         progress_label.pack()
 
+        global throughput_label
+        throughput_label = ttk.Label(progress_frame, text="")
+        throughput_label.pack()
+
     def create_tooltip(self, widget):
         """创建工具提示"""
 
@@ -657,7 +1248,39 @@ class ImageConverterApp:
         compression_value_label.config(text=f"{value}%")
 
 
+def report_startup_time(first_window, themed):
+    """输出启动耗时，并追加到缓存目录的 startup-times.jsonl（无控制台的打包版本也能查看）"""
+    record = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "first_window_ms": round(first_window * 1000),
+        "themed_ms": round(themed * 1000),
+        "frozen": "__compiled__" in globals() or getattr(sys, "frozen", False),
+    }
+    if sys.stderr is not None:
+        print(json.dumps(record), file=sys.stderr)
+    try:
+        os.makedirs(user_cache_dir(), exist_ok=True)
+        with open(os.path.join(user_cache_dir(), STARTUP_LOG_NAME), "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+
 if __name__ == "__main__":
-    root = ThemedTk(theme="arc")
+    multiprocessing.freeze_support()
+    if "--headless" in sys.argv[1:]:
+        from imagemove.cli import main as headless_main
+
+        sys.exit(headless_main([arg for arg in sys.argv[1:] if arg != "--headless"]))
+    root = tk.Tk()
     app = ImageConverterApp(root)
+    # 先显示窗口，再加载主题
+    root.update()
+    first_window = time.perf_counter() - START_TIME
+    app.apply_theme()
+    if "--startup-time" in sys.argv[1:]:
+        root.update()
+        report_startup_time(first_window, time.perf_counter() - START_TIME)
+        root.destroy()
+        sys.exit(0)
     root.mainloop()
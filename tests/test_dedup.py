@@ -0,0 +1,93 @@
+"""输入去重：重复检测、任务拆分，以及硬链接或复制生成的输出"""
+
+import os
+
+import pytest
+from PIL import Image
+
+from imagemove.core import ConversionJob, ConversionResult, plan_jobs
+from imagemove.dedup import find_duplicates, link_or_copy, materialize, split_jobs
+from imagemove.engine import BatchEngine
+
+
+@pytest.fixture
+def photos(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    Image.new("RGB", (64, 48), "red").save(folder / "a.png")
+    Image.new("RGB", (64, 48), "blue").save(folder / "c.png")
+    (folder / "b.png").write_bytes((folder / "a.png").read_bytes())
+    return [str(folder / name) for name in ("a.png", "b.png", "c.png")]
+
+
+def test_find_duplicates(photos):
+    a, b, c = photos
+    assert find_duplicates(photos) == {b: a}
+    assert find_duplicates([a, c]) == {}
+
+
+def test_split_jobs_by_source_and_output(photos, tmp_path):
+    a, b, c = photos
+    out = tmp_path / "out"
+    jobs = [
+        ConversionJob(a, str(out / "a.webp"), "webp", 80),
+        ConversionJob(b, str(out / "b.webp"), "webp", 80),
+        ConversionJob(b, str(out / "b_q60.webp"), "webp", 60),
+        ConversionJob(c, str(out / "c.webp"), "webp", 80),
+    ]
+    unique, followers = split_jobs(jobs)
+    # 质量不同的输出不是重复任务
+    assert unique == [jobs[0], jobs[2], jobs[3]]
+    assert followers == {jobs[0].output_path: [jobs[1]]}
+
+
+def test_link_or_copy_hardlinks(tmp_path):
+    source = tmp_path / "a.webp"
+    source.write_bytes(b"data")
+    target = tmp_path / "b.webp"
+    target.write_bytes(b"old")
+    link_or_copy(str(source), str(target))
+    assert os.path.samefile(source, target)
+
+
+def test_link_or_copy_falls_back_to_copy(tmp_path, monkeypatch):
+    def no_link(source, target):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    source = tmp_path / "a.webp"
+    source.write_bytes(b"data")
+    target = tmp_path / "b.webp"
+    link_or_copy(str(source), str(target))
+    assert target.read_bytes() == b"data"
+    assert not os.path.samefile(source, target)
+
+
+def test_materialize_propagates_errors(photos, tmp_path):
+    a, b, _ = photos
+    primary = ConversionResult(a, str(tmp_path / "a.webp"), "error", "boom")
+    result = materialize(primary, ConversionJob(b, str(tmp_path / "b.webp"), "webp"))
+    assert (result.status, result.error) == ("error", "boom")
+    assert not (tmp_path / "b.webp").exists()
+
+
+def test_materialize_counts_input_once(photos, tmp_path):
+    a, b, _ = photos
+    output = tmp_path / "a.webp"
+    output.write_bytes(b"data")
+    primary = ConversionResult(a, str(output), output_bytes=4)
+    job = ConversionJob(b, str(tmp_path / "b.webp"), "webp")
+    assert materialize(primary, job).input_bytes == os.path.getsize(b)
+    assert materialize(primary, job, count_input=False).input_bytes == 0
+
+
+def test_engine_links_duplicate_outputs(photos, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    jobs, _ = plan_jobs(photos, str(out), "webp", 80)
+    engine = BatchEngine(1, dedup=True, passthrough=False)
+    results = {os.path.basename(r.image_path): r for r in engine.run(jobs)}
+    assert {r.status for r in results.values()} == {"ok"}
+    assert results["b.png"].duplicate_of == photos[0]
+    assert results["c.png"].duplicate_of == ""
+    assert os.path.samefile(out / "a.webp", out / "b.webp")
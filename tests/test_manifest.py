@@ -0,0 +1,70 @@
+"""BatchManifest：记录、重新读取和判断输出是否最新"""
+
+import os
+
+import pytest
+
+from imagemove.core import ConversionJob, ConversionResult
+from imagemove.manifest import BatchManifest
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    source = tmp_path / "a.jpg"
+    source.write_bytes(b"source")
+    output_folder = tmp_path / "out"
+    output_folder.mkdir()
+    output = output_folder / "a.webp"
+    output.write_bytes(b"output")
+    job = ConversionJob(str(source), str(output), "webp", quality=80)
+    manifest = BatchManifest(output_folder)
+    manifest.record(job, ConversionResult(str(source), str(output)))
+    manifest.close()
+    return source, output, BatchManifest(output_folder)
+
+
+def entry(manifest, source):
+    return manifest.lookup(str(source), "webp")
+
+
+def test_current_after_reload(recorded):
+    source, output, manifest = recorded
+    found = entry(manifest, source)
+    assert manifest.output_path(found) == str(output)
+    assert manifest.is_current(found, 80)
+
+
+def test_encoding_settings_change(recorded):
+    source, _, manifest = recorded
+    found = entry(manifest, source)
+    assert not manifest.is_current(found, 70)
+    assert not manifest.is_current(found, 80, max_bytes=1000)
+    assert not manifest.is_current(found, 80, encoder_profile="fast")
+
+
+def test_source_changed(recorded):
+    source, _, manifest = recorded
+    source.write_bytes(b"changed source")
+    assert not manifest.is_current(entry(manifest, source), 80)
+
+
+def test_output_touched(recorded):
+    source, output, manifest = recorded
+    stat = output.stat()
+    os.utime(output, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not manifest.is_current(entry(manifest, source), 80)
+
+
+def test_output_deleted(recorded):
+    source, output, manifest = recorded
+    output.unlink()
+    assert not manifest.is_current(entry(manifest, source), 80)
+
+
+def test_truncated_line_ignored(recorded):
+    source, output, _ = recorded
+    manifest_path = output.parent / ".imagemove-manifest.jsonl"
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write('{"source": "')
+    manifest = BatchManifest(output.parent)
+    assert manifest.is_current(entry(manifest, source), 80)
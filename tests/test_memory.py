@@ -0,0 +1,149 @@
+"""内存预算：峰值内存估算、按预算标记低内存模式和派发"""
+
+from concurrent.futures import Future
+
+import pytest
+
+from imagemove.core import WECHAT_FORMAT, ConversionJob
+from imagemove.engine import BatchEngine
+from imagemove.memory import (
+    WORKER_BASE_MEMORY,
+    bytes_per_pixel,
+    estimate_group_memory,
+    estimate_job_memory,
+)
+from imagemove.metadata import ImageMetadata
+from imagemove.pipeline import PipelineStats
+
+MB = 1024 * 1024
+
+
+def meta(path="a.jpg", width=4000, height=3000, mode="RGB", fmt="JPEG", **kwargs):
+    return ImageMetadata(path, 0, 1, width, height, mode, fmt, **kwargs)
+
+
+def job(path="a.jpg", output_format="webp", **kwargs):
+    ext = "jpg" if output_format == WECHAT_FORMAT else output_format
+    return ConversionJob(path, f"out/{path}.{ext}", output_format, 80, **kwargs)
+
+
+def pixels_mb(value):
+    return (value - WORKER_BASE_MEMORY) / MB
+
+
+def test_bytes_per_pixel():
+    assert bytes_per_pixel("L") == 1
+    assert bytes_per_pixel("I;16") == 2
+    assert bytes_per_pixel("RGB") == 4
+
+
+def test_full_decode_without_resize():
+    decoded = 4000 * 3000 * 4
+    assert estimate_job_memory(job(), meta()) == int(decoded * 1.5) + WORKER_BASE_MEMORY
+
+
+def test_shrinking_jpeg_uses_draft_decode():
+    # 8000x6000 缩到 1440x1080 时按 1/2 的 DCT 缩放解码（4000x3000）
+    source = meta(width=8000, height=6000)
+    shrunk = estimate_job_memory(job(output_format=WECHAT_FORMAT), source)
+    assert pixels_mb(shrunk) * MB < 2 * 4000 * 3000 * 4
+    # 不支持 draft 的格式按完整尺寸解码
+    png = estimate_job_memory(
+        job(output_format=WECHAT_FORMAT), meta(width=8000, height=6000, fmt="PNG")
+    )
+    assert pixels_mb(png) * MB >= 8000 * 6000 * 4
+
+
+def test_grayscale_needs_less_than_rgb():
+    gray = estimate_job_memory(job(output_format="jpg"), meta(mode="L"))
+    assert pixels_mb(gray) * 4 == pytest.approx(
+        pixels_mb(estimate_job_memory(job(output_format="jpg"), meta()))
+    )
+
+
+def test_target_size_adds_search_copies():
+    plain = estimate_job_memory(job(), meta())
+    assert estimate_job_memory(job(max_bytes=100_000), meta()) > plain * 2
+
+
+def test_group_shares_one_decode():
+    estimates = [WORKER_BASE_MEMORY + 100 * MB, WORKER_BASE_MEMORY + 40 * MB]
+    assert estimate_group_memory(estimates) == WORKER_BASE_MEMORY + 120 * MB
+
+
+class FakeMetadata:
+    def __init__(self, entries):
+        self.entries = {entry.path: entry for entry in entries}
+
+    def get_many(self, paths):
+        return {path: self.entries[path] for path in paths if path in self.entries}
+
+
+def test_plan_memory_sorts_and_marks_low_memory():
+    small = meta("small.jpg", 400, 300)
+    large = meta("large.jpg", 8000, 6000)
+    engine = BatchEngine(
+        2,
+        metadata=FakeMetadata([small, large]),
+        memory_budget=200 * MB,
+        passthrough=False,
+    )
+    planned = engine.plan_memory([job("small.jpg"), job("large.jpg")])
+    assert [item.image_path for item, _ in planned] == ["large.jpg", "small.jpg"]
+    (large_job, large_estimate), (small_job, _) = planned
+    assert large_job.low_memory and not small_job.low_memory
+    assert large_estimate == 200 * MB  # 按预算计入
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, job, *args):
+        self.submitted.append(job.image_path)
+        return Future()
+
+
+class FakeReadAhead:
+    def take(self, path):
+        return None
+
+
+class FakeWriter:
+    depth = 0
+
+
+def admit(budget, pending, running=None, workers=4):
+    engine = BatchEngine(workers, memory_budget=budget)
+    engine.pipeline = PipelineStats()
+    engine.peak_memory_estimate = 0
+    executor = FakeExecutor()
+    running = {} if running is None else running
+    engine.admit(executor, pending, running, FakeReadAhead(), FakeWriter())
+    return executor.submitted, running
+
+
+def test_admit_skips_jobs_over_budget():
+    pending = [
+        (job("a.jpg"), 60 * MB),
+        (job("b.jpg"), 50 * MB),
+        (job("c.jpg"), 30 * MB),
+    ]
+    submitted, running = admit(100 * MB, pending)
+    # b 放不下时跳过，先派发放得下的 c
+    assert submitted == ["a.jpg", "c.jpg"]
+    assert [item.image_path for item, _ in pending] == ["b.jpg"]
+    assert sum(estimate for _, estimate in running.values()) == 90 * MB
+
+
+def test_admit_always_runs_one_job():
+    pending = [(job("huge.jpg"), 500 * MB)]
+    submitted, _ = admit(100 * MB, pending)
+    assert submitted == ["huge.jpg"]
+
+
+def test_admit_respects_worker_count():
+    pending = [(job(f"{i}.jpg"), MB) for i in range(5)]
+    submitted, _ = admit(100 * MB, pending, workers=2)
+    assert len(submitted) == 2
+    assert len(pending) == 3
@@ -0,0 +1,169 @@
+"""输出文件名分配：冲突策略、大小写、同批重名和多输出"""
+
+import os
+
+import pytest
+
+from imagemove.core import (
+    WECHAT_FORMAT,
+    OutputVariant,
+    assign_outputs,
+    existing_names,
+    plan_variant_jobs,
+    resolve_conflict,
+)
+
+
+def test_no_conflicts():
+    assert assign_outputs(["a.webp", "b.webp"], "skip", set()) == ["a.webp", "b.webp"]
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [("skip", [None]), ("overwrite", ["A.webp"]), ("rename", ["A_1.webp"])],
+)
+def test_existing_compared_case_insensitively(policy, expected):
+    assert assign_outputs(["A.webp"], policy, {"a.webp"}) == expected
+
+
+def test_rename_skips_existing_candidates():
+    existing = {"a.webp", "a_1.webp", "a_2.webp"}
+    assert assign_outputs(["a.webp"], "rename", existing) == ["a_3.webp"]
+
+
+@pytest.mark.parametrize("policy", ["skip", "overwrite", "rename"])
+def test_duplicates_in_batch_are_renamed(policy):
+    # 同一批中的重名总是改名，不论策略如何，避免互相覆盖
+    assert assign_outputs(["a.webp", "A.webp", "a.webp"], policy, set()) == [
+        "a.webp",
+        "A_1.webp",
+        "a_2.webp",
+    ]
+
+
+def test_reserved_names_are_taken():
+    assert assign_outputs(["a.webp"], "overwrite", set(), {"a.webp"}) == ["a_1.webp"]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        assign_outputs(["a.webp"], "ask", set())
+
+
+def test_resolve_conflict(tmp_path):
+    (tmp_path / "a.webp").write_bytes(b"x")
+    path = tmp_path / "A.webp"
+    assert resolve_conflict(path, "skip") is None
+    assert resolve_conflict(path, "overwrite") == str(path)
+    assert resolve_conflict(path, "rename") == str(tmp_path / "A_1.webp")
+
+
+def test_existing_names(tmp_path):
+    (tmp_path / "Photo.JPG").write_bytes(b"x")
+    assert existing_names(tmp_path) == {"photo.jpg"}
+    assert existing_names(tmp_path / "missing") == set()
+
+
+@pytest.fixture
+def sources(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    paths = []
+    for name in ("a.jpg", "A.png", "b.jpg"):
+        (folder / name).write_bytes(b"x")
+        paths.append(str(folder / name))
+    output = tmp_path / "out"
+    output.mkdir()
+    return paths, output
+
+
+def plan(paths, output, policy, variants=None, **kwargs):
+    jobs, skipped = plan_variant_jobs(
+        paths, str(output), variants or [OutputVariant("webp", 80)], policy, **kwargs
+    )
+    return [os.path.basename(job.output_path) for job in jobs], skipped
+
+
+def test_plan_renames_same_stem_in_batch(sources):
+    paths, output = sources
+    names, skipped = plan(paths, output, "skip")
+    assert names == ["a.webp", "A_1.webp", "b.webp"]
+    assert skipped == []
+
+
+def test_plan_skip(sources):
+    paths, output = sources
+    (output / "B.WEBP").write_bytes(b"x")
+    names, skipped = plan(paths, output, "skip")
+    assert names == ["a.webp", "A_1.webp"]
+    assert [(r.image_path, r.status) for r in skipped] == [(paths[2], "skipped")]
+
+
+def test_plan_overwrite(sources):
+    paths, output = sources
+    (output / "b.webp").write_bytes(b"x")
+    names, _ = plan(paths, output, "overwrite")
+    assert names == ["a.webp", "A_1.webp", "b.webp"]
+
+
+def test_plan_rename(sources):
+    paths, output = sources
+    (output / "a.webp").write_bytes(b"x")
+    names, _ = plan(paths, output, "rename")
+    assert names == ["a_1.webp", "A_2.webp", "b.webp"]
+
+
+def test_plan_uses_given_existing_names(sources):
+    # 传入 existing 时不再列目录
+    paths, output = sources
+    names, skipped = plan(paths[2:], output, "skip", existing={"b.webp"})
+    assert names == []
+    assert len(skipped) == 1
+
+
+def test_plan_policy_callback(sources):
+    paths, output = sources
+    (output / "b.webp").write_bytes(b"x")
+    seen = []
+
+    def ask(conflicts):
+        seen.append(conflicts)
+        return "rename"
+
+    names, _ = plan(paths, output, ask)
+    assert seen == [[str(output / "b.webp")]]
+    assert names[-1] == "b_1.webp"
+
+
+def test_plan_policy_callback_cancel(sources):
+    paths, output = sources
+    (output / "b.webp").write_bytes(b"x")
+    variants = [OutputVariant("webp", 80)]
+    assert plan_variant_jobs(paths, str(output), variants, lambda c: None) is None
+
+
+def test_plan_callback_not_called_without_conflicts(sources):
+    paths, output = sources
+
+    def ask(conflicts):
+        raise AssertionError("不应询问")
+
+    names, _ = plan(paths, output, ask)
+    assert names == ["a.webp", "A_1.webp", "b.webp"]
+
+
+def test_plan_variants_are_adjacent_with_suffixes(sources):
+    paths, output = sources
+    variants = [
+        OutputVariant("jpg", 90),
+        OutputVariant("webp", 75, 400, "_thumb"),
+        OutputVariant(WECHAT_FORMAT, 85),
+    ]
+    jobs, _ = plan_variant_jobs(paths[2:], str(output), variants)
+    assert [os.path.basename(job.output_path) for job in jobs] == [
+        "b.jpg",
+        "b_thumb.webp",
+        "b_wechat.jpg",
+    ]
+    assert [job.max_dimension for job in jobs] == [0, 400, 0]
+    assert {job.image_path for job in jobs} == {paths[2]}
@@ -0,0 +1,90 @@
+"""passthrough_reason：格式、方向、质量、EXIF 和朋友圈适用规则"""
+
+from dataclasses import replace
+
+import pytest
+
+from imagemove.core import WECHAT_FORMAT, ConversionJob
+from imagemove.metadata import ImageMetadata
+from imagemove.passthrough import passthrough_reason
+
+
+def jpeg(**kwargs):
+    fields = dict(
+        path="in/a.jpg",
+        mtime_ns=0,
+        size=200_000,
+        width=800,
+        height=600,
+        mode="RGB",
+        format="JPEG",
+        quality=75,
+    )
+    fields.update(kwargs)
+    return ImageMetadata(**fields)
+
+
+def job(output_format="jpg", quality=80, **kwargs):
+    ext = "jpg" if output_format == WECHAT_FORMAT else output_format
+    return ConversionJob("in/a.jpg", f"out/a.{ext}", output_format, quality, **kwargs)
+
+
+def test_same_format_at_lower_quality_is_copied():
+    assert passthrough_reason(job(quality=80), jpeg(quality=75)) == "same-format"
+
+
+def test_source_quality_above_target_is_reencoded():
+    assert passthrough_reason(job(quality=60), jpeg(quality=75)) == ""
+
+
+def test_unknown_source_quality_is_reencoded():
+    assert passthrough_reason(job(quality=80), jpeg(quality=0)) == ""
+
+
+def test_quality_100_copies_any_source_quality():
+    assert passthrough_reason(job(quality=100), jpeg(quality=95)) == "same-format"
+
+
+def test_max_compression_profile_is_reencoded():
+    meta = jpeg(quality=50)
+    assert passthrough_reason(job(encoder_profile="max-compression"), meta) == ""
+
+
+def test_other_format_is_reencoded():
+    assert passthrough_reason(job("webp"), jpeg()) == ""
+
+
+def test_lossy_non_jpeg_source_is_reencoded_below_100():
+    meta = jpeg(format="WEBP", quality=0)
+    assert passthrough_reason(job("webp", 80), meta) == ""
+    assert passthrough_reason(job("webp", 100), meta) == "same-format"
+
+
+@pytest.mark.parametrize("orientation", [3, 6, 8])
+def test_orientation_needs_transform(orientation):
+    assert passthrough_reason(job(), jpeg(orientation=orientation)) == ""
+
+
+def test_size_and_dimension_limits():
+    meta = jpeg(size=200_000)
+    assert passthrough_reason(job(max_bytes=100_000), meta) == ""
+    assert passthrough_reason(job(max_bytes=300_000), meta) == "same-format"
+    assert passthrough_reason(job(max_dimension=400), meta) == ""
+    assert passthrough_reason(job(max_dimension=800), meta) == "same-format"
+
+
+def test_mode_not_encodable():
+    assert passthrough_reason(job(), jpeg(mode="P")) == ""
+
+
+def test_exif_not_copied_when_reencoding_strips_it():
+    # 重新编码为 JPG 会去掉 EXIF（包括 GPS），直接复制则会保留
+    assert passthrough_reason(job(), jpeg(has_exif=True)) == ""
+
+
+def test_wechat():
+    meta = jpeg(width=1440, height=1080, has_exif=True)
+    assert passthrough_reason(job(WECHAT_FORMAT), meta) == "wechat"
+    assert passthrough_reason(job(WECHAT_FORMAT), replace(meta, height=1200)) == ""
+    assert passthrough_reason(job(WECHAT_FORMAT), replace(meta, mode="CMYK")) == ""
+    assert passthrough_reason(job(WECHAT_FORMAT, 60), meta) == ""
@@ -0,0 +1,54 @@
+"""encode_to_target：按大小上限搜索质量"""
+
+import random
+
+from PIL import Image
+
+from imagemove.target import MIN_TARGET_QUALITY, encode, encode_to_target
+
+
+def noisy_image(width=256, height=192):
+    rng = random.Random(0)
+    return Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+
+
+def jpeg_options(quality):
+    return {"quality": quality}
+
+
+def test_finds_highest_quality_under_limit():
+    img = noisy_image()
+    sizes = {q: len(encode(img, "JPEG", jpeg_options(q))) for q in range(10, 96)}
+    limit = sizes[60]
+    data, quality, attempts = encode_to_target(img, "JPEG", limit, jpeg_options)
+    assert len(data) <= limit
+    assert quality == max(q for q, size in sizes.items() if size <= limit)
+    assert 1 < attempts < len(sizes)
+
+
+def test_single_thread_matches():
+    img = noisy_image()
+    limit = len(encode(img, "JPEG", jpeg_options(50)))
+    assert encode_to_target(img, "JPEG", limit, jpeg_options, threads=1)[1] == (
+        encode_to_target(img, "JPEG", limit, jpeg_options)[1]
+    )
+
+
+def test_limit_unreachable_returns_lowest_quality():
+    data, quality, _ = encode_to_target(noisy_image(), "JPEG", 100, jpeg_options)
+    assert quality == MIN_TARGET_QUALITY
+    assert len(data) > 100
+
+
+def test_quality_has_no_effect_encodes_once():
+    calls = []
+
+    def options(quality):
+        calls.append(quality)
+        return {}
+
+    data, quality, attempts = encode_to_target(noisy_image(), "PNG", 100, options)
+    assert quality is None
+    assert attempts == 1
+    assert len(calls) == 1
+    assert data.startswith(b"\x89PNG")
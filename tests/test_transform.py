@@ -0,0 +1,84 @@
+"""plan_transform：操作顺序、draft 尺寸和方向修正"""
+
+from PIL import Image
+
+from imagemove.transform import TransformStep, plan_transform
+
+
+def ops(plan):
+    return [step.op for step in plan.steps]
+
+
+def test_nothing_to_do():
+    plan = plan_transform((640, 480), "RGB", pil_format="JPEG")
+    assert plan.steps == []
+    assert plan.draft_size is None
+    assert not plan.transposes
+    assert plan.output_size == (640, 480)
+    assert plan.output_mode == "RGB"
+
+
+def test_orientation_1_does_not_transpose():
+    plan = plan_transform((640, 480), "RGB", orientation=1)
+    assert not plan.transposes
+
+
+def test_rotation_swaps_output_size():
+    plan = plan_transform((640, 480), "RGB", orientation=6)
+    assert plan.steps == [TransformStep("transpose", Image.Transpose.ROTATE_270)]
+    assert plan.output_size == (480, 640)
+
+
+def test_resize_before_transpose():
+    # 目标尺寸按修正后的方向给出，缩放在原始方向上进行
+    plan = plan_transform((4000, 3000), "RGB", orientation=6, target_size=(300, 400))
+    assert ops(plan) == ["resize", "transpose"]
+    assert plan.steps[0].arg == (400, 300)
+    assert plan.output_size == (300, 400)
+
+
+def test_shrink_uses_draft_with_reducing_gap():
+    plan = plan_transform((4000, 3000), "RGB", target_size=(400, 300))
+    assert plan.draft_size == (800, 600)
+    plan = plan_transform((4000, 3000), "RGB", target_size=(400, 300), reducing_gap=3)
+    assert plan.draft_size == (1200, 900)
+
+
+def test_enlarge_does_not_draft():
+    plan = plan_transform((400, 300), "RGB", target_size=(800, 600))
+    assert plan.draft_size is None
+    assert ops(plan) == ["resize"]
+
+
+def test_same_size_is_not_resized():
+    plan = plan_transform((400, 300), "RGB", target_size=(400, 300))
+    assert plan.steps == []
+
+
+def test_convert_after_shrinking():
+    plan = plan_transform(
+        (4000, 3000), "RGBA", pil_format="JPEG", target_size=(400, 300)
+    )
+    assert ops(plan) == ["resize", "convert"]
+    assert plan.output_mode == "RGB"
+
+
+def test_convert_before_enlarging():
+    plan = plan_transform((400, 300), "RGBA", pil_format="JPEG", target_size=(800, 600))
+    assert ops(plan) == ["convert", "resize"]
+
+
+def test_palette_converted_before_resize():
+    # "P" 模式直接缩放会退化为最近邻，先转换
+    plan = plan_transform(
+        (4000, 3000), "P", pil_format="WEBP", target_size=(400, 300), has_alpha=True
+    )
+    assert ops(plan) == ["convert", "resize"]
+    assert plan.output_mode == "RGBA"
+
+
+def test_output_modes():
+    assert plan_transform((10, 10), "1", pil_format="JPEG").output_mode == "L"
+    assert plan_transform((10, 10), "CMYK", pil_format="JPEG").output_mode == "CMYK"
+    assert plan_transform((10, 10), "CMYK", pil_format="WEBP").output_mode == "RGB"
+    assert plan_transform((10, 10), "LA", pil_format="WEBP").output_mode == "RGBA"